@@ -1 +1,20 @@
-from .automatic_matching_functions import *
\ No newline at end of file
+from .automatic_matching_functions import *
+from .assignment import *
+from .blocking import *
+from .batch import *
+from .columnar_output import *
+from .shortform_index import *
+from .minhash_lsh import *
+from .bk_tree import *
+from .name_graph import *
+from .date_table import *
+from .pipeline import *
+from .metrics import *
+from .tabular import *
+from .candidate_source import *
+from .equivalence import *
+from .normalization import *
+from .place_index import *
+from .bitset_signatures import *
+from .estimation import *
+from .pair_cache import *
@@ -0,0 +1,184 @@
+import heapq
+import math
+
+ASSIGNMENT_METHOD_GREEDY = 'greedy'
+ASSIGNMENT_METHOD_OPTIMAL = 'optimal'
+
+
+def get_scored_pairs(scored_results, score_key='absolute_score'):
+    '''
+        Converts (local_id, external_id, result) triples, where result is the dict returned
+        by get_matching_score, into the (local_id, external_id, score) triples expected by
+        assign_one_to_one.
+    '''
+    return [(local_id, external_id, result[score_key]) for local_id, external_id, result in scored_results]
+
+
+def get_connected_components(scored_pairs):
+    '''
+        Splits the bipartite graph given by (local_id, external_id, score) triples into
+        independent connected components using a union find over the record ids.
+        Local and external ids live in separate namespaces, so the same id may be used in both databases.
+        Returns a list of lists of triples, one list per component.
+    '''
+    parents = {}
+
+    def find(node):
+        root = node
+        while parents[root] != root:
+            root = parents[root]
+        while parents[node] != root:
+            parents[node], node = root, parents[node]
+        return root
+
+    for local_id, external_id, score in scored_pairs:
+        local_node = ('local', local_id)
+        external_node = ('external', external_id)
+        parents.setdefault(local_node, local_node)
+        parents.setdefault(external_node, external_node)
+        local_root = find(local_node)
+        external_root = find(external_node)
+        if local_root != external_root:
+            parents[external_root] = local_root
+
+    components = {}
+    for pair in scored_pairs:
+        root = find(('local', pair[0]))
+        if root not in components:
+            components[root] = []
+        components[root].append(pair)
+    return list(components.values())
+
+
+def assign_greedy(scored_pairs):
+    '''
+        Assigns pairs in order of decreasing score, skipping every pair of which either
+        record has already been assigned. Ties keep the order of the input.
+    '''
+    assigned_local = set()
+    assigned_external = set()
+    assignment = []
+    for local_id, external_id, score in sorted(scored_pairs, key=lambda x: -x[2]):
+        if local_id in assigned_local or external_id in assigned_external:
+            continue
+        assigned_local.add(local_id)
+        assigned_external.add(external_id)
+        assignment.append((local_id, external_id, score))
+    return assignment
+
+
+def solve_sparse_assignment(adjacency, number_of_columns):
+    '''
+        Maximum weight matching of a sparse bipartite graph, given as a list per row of (column, score) with
+        positive scores. Returns for every row the index of the assigned column, -1 for unassigned rows.
+
+        Hungarian algorithm with shortest augmenting paths over the edges only: every row gets a private
+        column of score 0 standing for "unassigned", so all rows can be assigned and the assignment of
+        minimal total cost max_score - score is the one of maximal total score. The rows are added one at
+        a time, each with a Dijkstra search from the new row using potentials, which stops at the first free
+        column. Memory is linear in the number of edges, the time at most rows * edges * log(edges)
+        and much less on the sparse, mostly tree shaped components of candidate graphs.
+    '''
+    number_of_rows = len(adjacency)
+    max_score = max((score for edges in adjacency for column, score in edges), default=0)
+    row_potentials = [0.0] * number_of_rows
+    column_potentials = [0.0] * (number_of_columns + number_of_rows)
+    column_assignment = [-1] * (number_of_columns + number_of_rows)
+    row_assignment = [-1] * number_of_rows
+
+    for source in range(number_of_rows):
+        distances = {}
+        previous_rows = {}
+        finalized_rows = {source: 0.0}
+        finalized_columns = {}
+        heap = []
+        row, row_distance = source, 0.0
+        while True:
+            for column, score in adjacency[row] + [(number_of_columns + row, 0)]:
+                if column in finalized_columns:
+                    continue
+                distance = row_distance + max_score - score + row_potentials[row] - column_potentials[column]
+                if distance < distances.get(column, math.inf):
+                    distances[column] = distance
+                    previous_rows[column] = row
+                    heapq.heappush(heap, (distance, column))
+            distance, column = heapq.heappop(heap)
+            while column in finalized_columns or distance > distances[column]:
+                distance, column = heapq.heappop(heap)
+            finalized_columns[column] = distance
+            if column_assignment[column] == -1:
+                break
+            # matched edges have a reduced cost of 0
+            row, row_distance = column_assignment[column], distance
+            finalized_rows[row] = distance
+
+        # keeps the reduced costs of all edges non-negative, those of the augmenting path become 0
+        for row, row_distance in finalized_rows.items():
+            row_potentials[row] += row_distance - distance
+        for finalized_column, column_distance in finalized_columns.items():
+            column_potentials[finalized_column] += column_distance - distance
+
+        while True:
+            row = previous_rows[column]
+            next_column = row_assignment[row]
+            row_assignment[row] = column
+            column_assignment[column] = row
+            if row == source:
+                break
+            column = next_column
+
+    return [column if column < number_of_columns else -1 for column in row_assignment]
+
+
+def assign_optimal(scored_pairs):
+    '''
+        Computes the one-to-one assignment that maximizes the total score of a single
+        connected component. Missing pairs are treated as "not assignable".
+    '''
+    local_ids = {}
+    external_ids = {}
+    scores = {}
+    for local_id, external_id, score in scored_pairs:
+        row = local_ids.setdefault(local_id, len(local_ids))
+        column = external_ids.setdefault(external_id, len(external_ids))
+        if (row, column) not in scores or score > scores[(row, column)][2]:
+            scores[(row, column)] = (local_id, external_id, score)
+
+    adjacency = [[] for _ in local_ids]
+    for (row, column), (local_id, external_id, score) in scores.items():
+        adjacency[row].append((column, score))
+
+    assignment = []
+    for row, column in enumerate(solve_sparse_assignment(adjacency, len(external_ids))):
+        if column != -1:
+            assignment.append(scores[(row, column)])
+    return sorted(assignment, key=lambda x: -x[2])
+
+
+def assign_one_to_one(scored_pairs, method=ASSIGNMENT_METHOD_GREEDY, min_score=None):
+    '''
+        Takes a sparse list of scored candidate pairs (local_id, external_id, score), e.g. using
+        the absolute_score of get_matching_score, and resolves it into a one-to-one matching.
+        Only pairs with a positive score (and at least min_score if provided) can be assigned.
+
+        method 'greedy' assigns by decreasing score, 'optimal' maximizes the total score.
+        Both work on the independent connected components of the candidate graph, so the
+        optimal assignment only has to solve many small problems instead of one huge one.
+        The optimal assignment works on the candidate pairs only, see solve_sparse_assignment.
+
+        Returns a list of (local_id, external_id, score) triples.
+    '''
+    if method not in [ASSIGNMENT_METHOD_GREEDY, ASSIGNMENT_METHOD_OPTIMAL]:
+        raise ValueError(f'Unknown assignment method: {method}')
+
+    scored_pairs = [pair for pair in scored_pairs if pair[2] > 0 and (min_score == None or pair[2] >= min_score)]
+
+    assignment = []
+    for component in get_connected_components(scored_pairs):
+        if len(component) == 1:
+            assignment += component
+        elif method == ASSIGNMENT_METHOD_GREEDY:
+            assignment += assign_greedy(component)
+        else:
+            assignment += assign_optimal(component)
+    return assignment
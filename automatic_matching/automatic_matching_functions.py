@@ -3,22 +3,39 @@ import re
 import numpy as np
 from difflib import *
 import datetime
+import threading
 from dateutil.relativedelta import relativedelta
 
 from Levenshtein import distance as levenshtein_distance
 from Levenshtein import ratio as levenshtein_ratio
 from pyxdameraulevenshtein import damerau_levenshtein_distance, normalized_damerau_levenshtein_distance, damerau_levenshtein_distance_seqs
 from rapidfuzz import fuzz
+from rapidfuzz.distance import OSA
 from doublemetaphone import doublemetaphone
 
 AUTOMATIC_MATCHING_ALGORITHM_VERSION_STRING = "2.7"
 
 DATE_COMPARISON_BY_TIMEDELTA_MAX_NUMBER_OF_DAYS = 4
 
-latin_transliterator = icu.Transliterator.createInstance('Any-Latin; Latin-ASCII;IPA-XSampa;NFD; [:Nonspacing Mark:] Remove; NFC; Lower();')
+LATIN_TRANSLITERATOR_RULES = 'Any-Latin; Latin-ASCII;IPA-XSampa;NFD; [:Nonspacing Mark:] Remove; NFC; Lower();'
 # Creates a transliterator that replaces all non latin characters, removes all accents and lowercases the entire string.
 # For testing see: https://icu4c-demos.unicode.org/icu-bin/translit
 
+latin_transliterator = icu.Transliterator.createInstance(LATIN_TRANSLITERATOR_RULES)
+# ICU transliterators must not be shared between threads, the scoring functions use get_latin_transliterator() instead.
+
+transliterator_storage = threading.local()
+
+def get_latin_transliterator():
+    """
+        Returns the transliterator of the current thread, creating it on first use.
+    """
+    transliterator = getattr(transliterator_storage, 'latin_transliterator', None)
+    if transliterator == None:
+        transliterator = icu.Transliterator.createInstance(LATIN_TRANSLITERATOR_RULES)
+        transliterator_storage.latin_transliterator = transliterator
+    return transliterator
+
 replacements = {
         'á': 'a',        'ï': 'i',        'ş': 's',        'ó': 'o',
         'ł': 'l',        'ñ': 'n',        'è': 'e',        'ç': 'c',
@@ -51,7 +68,7 @@ replacements = {
 def test_transliteration():
     matches = 0
     for replacement in replacements:
-        translit = latin_transliterator.transliterate(replacement)
+        translit = get_latin_transliterator().transliterate(replacement)
         if translit != replacements[replacement]:
             print('Replacement mismatch', translit, replacement, replacements[replacement])
         else:
@@ -75,6 +92,18 @@ year_weights = np.array([
     0.75,
 ])
 
+# The string score of a date comparison saturates at 3, distances beyond these cutoffs can't change the result:
+# the first sequence enters with its plain distance, the others with 6 * x (month-day) or 2 * x (year) plus their weight.
+month_day_distance_cutoffs = [3, 0, 0, 0, 0]
+year_distance_cutoffs = [3, 1]
+
+def get_bounded_distances(value, sequences, cutoffs):
+    """
+        Same as damerau_levenshtein_distance_seqs, but the comparison with each sequence is aborted as soon
+        as its cutoff is exceeded, in which case cutoff + 1 is returned instead of the exact distance.
+    """
+    return [OSA.distance(value, sequence, score_cutoff=cutoff) for sequence, cutoff in zip(sequences, cutoffs)]
+
 TTP_MATCHING_DEFAULT_DISREGARD_VALUES = {
     'forenames': ['Israel', 'Sarah', 'Sara'],
     'birth_place': ['Deutsches', 'Reich']
@@ -276,11 +305,32 @@ def datetime_range_matches_date(thresholds, dates, external_range=False):
             
     return matches, non_matches
 
+def merge_converted_dates(converted_dates_list):
+    """
+        Combines the results of convert_dates for single dates into the result convert_dates would return for all of them.
+    """
+    thresholds = {}
+    dates_list = []
+    for converted_dates in converted_dates_list:
+        if 'min' in converted_dates['thresholds'] and ('min' not in thresholds or converted_dates['thresholds']['min'] < thresholds['min']):
+            thresholds['min'] = converted_dates['thresholds']['min']
+        if 'max' in converted_dates['thresholds'] and ('max' not in thresholds or converted_dates['thresholds']['max'] > thresholds['max']):
+            thresholds['max'] = converted_dates['thresholds']['max']
+        dates_list += converted_dates['dates']
+    return {
+        'thresholds': thresholds,
+        'dates': dates_list,
+    }
+
 def match_date_against_local_date(local_dates, external_dates):
+    return match_converted_dates(local_dates, external_dates, convert_dates(local_dates), convert_dates(external_dates))
+
+def match_converted_dates(local_dates, external_dates, converted_local_dates, converted_external_dates):
+    """
+        Same as match_date_against_local_date for dates that have already been passed through convert_dates.
+    """
     scores = []
     result = {}
-    converted_local_dates = convert_dates(local_dates)
-    converted_external_dates = convert_dates(external_dates)
     converted_local_dates_thresholds_len = len(converted_local_dates['thresholds'])
     converted_external_dates_thresholds_len = len(converted_external_dates['thresholds'])
 
@@ -336,10 +386,10 @@ def match_date_against_local_date(local_dates, external_dates):
     else:
         for local_date in converted_local_dates['dates']:
             for external_date in converted_external_dates['dates']:
-                month_day_comparison = np.array(damerau_levenshtein_distance_seqs(external_date['month_day_sequences'][0], local_date['month_day_sequences']))
+                month_day_comparison = np.array(get_bounded_distances(external_date['month_day_sequences'][0], local_date['month_day_sequences'], month_day_distance_cutoffs))
                 month_day_comparison[1:] *= 6
                 month_day_comparison = month_day_comparison + month_day_weights
-                year_comparison = np.array(damerau_levenshtein_distance_seqs(external_date['year_sequences'][0], local_date['year_sequences']))
+                year_comparison = np.array(get_bounded_distances(external_date['year_sequences'][0], local_date['year_sequences'], year_distance_cutoffs))
                 year_comparison[1:] *= 2
                 year_comparison = year_comparison + year_weights
                 string_score = np.min(month_day_comparison) + np.min(year_comparison)
@@ -386,7 +436,7 @@ def match_date_against_local_date(local_dates, external_dates):
     return result
 
 def normalize_string(value, is_surname = False):
-    value = latin_transliterator.transliterate(value)
+    value = get_latin_transliterator().transliterate(value)
     if is_surname:
         value = re.sub(r'owa$|ova$', '', value)
         value = re.sub(r'sohns$', 'sons', value)
@@ -402,15 +452,27 @@ def normalize_string(value, is_surname = False):
         value = value.replace('tz', 'z')
     return re.sub(r'([a-zA-Z])\1', r'\1', value) # Remove double chararcters
 
-def get_doublemetaphone_matching_score(val_1, val_2, potential_shortform = False):
+def is_potential_shortform_code(code_1, code_2):
+    """
+        Returns True if the shorter of two Double Metaphone codes is entirely contained in the longer one,
+        i.e. the first matching block of a SequenceMatcher covers the entire shorter code.
+    """
+    return len(code_1) > 0 and len(code_2) > 0 and (code_1 in code_2 or code_2 in code_1)
+
+def get_doublemetaphone_matching_score(val_1, val_2, potential_shortform = False, shortform_index = None):
     """
         Returns a range from 0 (perfect match) to 1 (significant differences)
         the flag potential_shortform indicates that names might be shortened, 
         This way we are able to consider that e.g. Alex and Alexander are
         highly likely equivalent as a name.
+        An optional ShortformIndex provides cached metaphone codes.
     """
-    dm_val_1 = doublemetaphone(val_1)
-    dm_val_2 = doublemetaphone(val_2)
+    if shortform_index != None:
+        dm_val_1 = shortform_index.get_codes(val_1)
+        dm_val_2 = shortform_index.get_codes(val_2)
+    else:
+        dm_val_1 = doublemetaphone(val_1)
+        dm_val_2 = doublemetaphone(val_2)
 
     metaphone_sim = 0
     min_val_len = min(len(val_1), len(val_2))
@@ -420,24 +482,22 @@ def get_doublemetaphone_matching_score(val_1, val_2, potential_shortform = False
         dm_min_len_1 = max(min(len(dm_val_1[0]), len(dm_val_2[0])), 1)
         dm_min_len_2 = max(min(len(dm_val_1[1]), len(dm_val_2[1])), 1)
 
-        similarity_1 = max(1 - levenshtein_distance(dm_val_1[0], dm_val_2[0]) / dm_min_len_1, 0)
-        similarity_2 = max(1 - levenshtein_distance(dm_val_1[1], dm_val_2[1]) / dm_min_len_2, 0)
+        # similarities are clipped at 0, so the distances only have to be computed up to the respective length
+        similarity_1 = max(1 - levenshtein_distance(dm_val_1[0], dm_val_2[0], score_cutoff=dm_min_len_1) / dm_min_len_1, 0)
+        similarity_2 = max(1 - levenshtein_distance(dm_val_1[1], dm_val_2[1], score_cutoff=dm_min_len_2) / dm_min_len_2, 0)
         
-        dlr = max( 1 - damerau_levenshtein_distance(val_1.lower(), val_2.lower()) / min_val_len, 0)
+        dlr = max( 1 - OSA.distance(val_1.lower(), val_2.lower(), score_cutoff=min_val_len) / min_val_len, 0)
         
         if potential_shortform:
-            dm_matching_blocks_1 = SequenceMatcher(None, dm_val_1[0], dm_val_2[0]).get_matching_blocks()
-            if dm_matching_blocks_1[0][2] == dm_min_len_1 and dm_matching_blocks_1[1][2] == 0:
-                dm_matching_blocks_2 = SequenceMatcher(None, dm_val_1[1], dm_val_2[1]).get_matching_blocks()
-                if dm_matching_blocks_2[0][2] == dm_min_len_2 and dm_matching_blocks_2[1][2] == 0:
-                    if dm_min_len_1 <= 2 or dm_min_len_2 <= 2:
-                        dlr_part = fuzz.partial_ratio(val_1.lower(), val_2.lower())
-                        if dlr_part >= 85:
-                            similarity_1 = 1
-                            similarity_2 = 1 
-                    else:
+            if is_potential_shortform_code(dm_val_1[0], dm_val_2[0]) and is_potential_shortform_code(dm_val_1[1], dm_val_2[1]):
+                if dm_min_len_1 <= 2 or dm_min_len_2 <= 2:
+                    dlr_part = fuzz.partial_ratio(val_1.lower(), val_2.lower())
+                    if dlr_part >= 85:
                         similarity_1 = 1
-                        similarity_2 = 1
+                        similarity_2 = 1 
+                else:
+                    similarity_1 = 1
+                    similarity_2 = 1
         metaphone_sim = (similarity_1 + similarity_2) / 2
         if metaphone_sim < 1:
             metaphone_sim = (metaphone_sim + dlr) / 2
@@ -451,7 +511,10 @@ def split_string_values(value):
     val = value.replace('(', '').replace(')', '').replace(':', '')
     return list(filter(None, re.split('; |, |/ |-| ', val)))
 
-def get_names_as_dict(names, is_surname=False, remove_acronyms=True):
+def get_names_as_dict(names, is_surname=False, remove_acronyms=True, normalizer=None):
+    '''
+        Returns a dict of normalized name -> original names. An optional NameNormalizer replaces normalize_string.
+    '''
     result = {}
     names_split = []
     for name in names:
@@ -464,7 +527,7 @@ def get_names_as_dict(names, is_surname=False, remove_acronyms=True):
             if remove_acronyms and name_length == 2 and name[-1] == '.':
                 continue
         if name_length > 0:
-            normalized_value = normalize_string(name, is_surname)
+            normalized_value = normalizer.normalize(name, is_surname) if normalizer != None else normalize_string(name, is_surname)
             if normalized_value not in result:
                 result[normalized_value] = []
             result[normalized_value].append(name)
@@ -480,11 +543,17 @@ def get_names_as_list_flattend(values, is_surname = False):
             result.append(orig_val)
     return ', '.join(result)
 
-def match_against_local_data(local_data, external_data, disregard_data_set={}, potential_shortform = False):
+def match_against_local_data(local_data, external_data, disregard_data_set={}, potential_shortform = False, shortform_index = None, name_graph = None):
     '''
         Takes two lists of local and external values and compares them.
         Returns a value between -1 (no match) and 1 (perfect match), following a cosine function.
+        If a NameSimilarityGraph is provided, name scores are looked up instead of computed.
     '''
+    if name_graph != None:
+        get_name_score = lambda val_1, val_2: name_graph.get_score(val_1, val_2, potential_shortform)
+    else:
+        get_name_score = lambda val_1, val_2: get_doublemetaphone_matching_score(val_1, val_2, potential_shortform, shortform_index)
+
     matched_pairs = []
     larger_data_set = external_data
     larger_data_set_label = 'external'
@@ -530,15 +599,14 @@ def match_against_local_data(local_data, external_data, disregard_data_set={}, p
                 names_matching_disregard_value_in_larger_set_original += 1
         
     for larger_original in names_in_larger_set_original:
-        damerau_levenshtein_distance_sequences = damerau_levenshtein_distance_seqs(larger_original, list(names_in_smaller_set_original.keys()))
-        if min(damerau_levenshtein_distance_sequences) == 0:
+        # only a distance of 0 is of interest here, which is equivalent to an exact lookup
+        if larger_original in names_in_smaller_set_original:
             # found exact expression in other data set no need for further search.
             names_in_larger_set_original[larger_original] = 0
-            if larger_original in names_in_smaller_set_original: # if there is an exact match in the smaller data set we can set this to 0 as well
-                names_in_smaller_set_original[larger_original] = 0
+            names_in_smaller_set_original[larger_original] = 0
         else:
             for smaller_original in smaller_data_set:
-                doublemetaphone_matching_score = get_doublemetaphone_matching_score(larger_original, smaller_original, potential_shortform)
+                doublemetaphone_matching_score = get_name_score(larger_original, smaller_original)
                 names_in_larger_set_original[larger_original].append(doublemetaphone_matching_score)
                 if doublemetaphone_matching_score == 0:
                     break
@@ -549,7 +617,7 @@ def match_against_local_data(local_data, external_data, disregard_data_set={}, p
             continue
 
         for larger_original in larger_data_set:
-            doublemetaphone_matching_score = get_doublemetaphone_matching_score(larger_original, smaller_original, potential_shortform)
+            doublemetaphone_matching_score = get_name_score(larger_original, smaller_original)
             names_in_smaller_set_original[smaller_original].append(doublemetaphone_matching_score)
             if doublemetaphone_matching_score == 0:
                 break
@@ -557,15 +625,13 @@ def match_against_local_data(local_data, external_data, disregard_data_set={}, p
         names_in_smaller_set_original[smaller_original] = min(names_in_smaller_set_original[smaller_original])
 
     for larger in larger_data_set:
-        damerau_levenshtein_distance_sequences = damerau_levenshtein_distance_seqs(larger, list(smaller_data_set.keys()))
-        if min(damerau_levenshtein_distance_sequences) == 0:
+        if larger in smaller_data_set:
             # a perfect match has been found for the normalized names.
             names_in_larger_set_normalized[larger] = 0
-            if larger in names_in_smaller_set_normalized: # if there is an exact match in the smaller data set we can set this to 0 as well
-                names_in_smaller_set_normalized[larger] = 0
+            names_in_smaller_set_normalized[larger] = 0
         else:
             for smaller in smaller_data_set:
-                normalized_doublemetaphone_matching_score = get_doublemetaphone_matching_score(larger, smaller, potential_shortform)
+                normalized_doublemetaphone_matching_score = get_name_score(larger, smaller)
                 names_in_larger_set_normalized[larger].append(normalized_doublemetaphone_matching_score)
                 if normalized_doublemetaphone_matching_score == 0:
                     # if for the normalized score a perfect match was found we end our search here
@@ -578,13 +644,12 @@ def match_against_local_data(local_data, external_data, disregard_data_set={}, p
         if names_in_smaller_set_normalized[smaller] == 0:
             # if a perfect match was already found in the previous loop
             continue
-        damerau_levenshtein_distance_sequences = damerau_levenshtein_distance_seqs(smaller, list(larger_data_set.keys()))
-        if min(damerau_levenshtein_distance_sequences) == 0:
+        if smaller in larger_data_set:
             # a perfect match has been found for the normalized names.
             names_in_smaller_set_normalized[smaller] = 0
         else:
             for larger in larger_data_set:
-                normalized_doublemetaphone_matching_score = get_doublemetaphone_matching_score(larger, smaller, potential_shortform)
+                normalized_doublemetaphone_matching_score = get_name_score(larger, smaller)
                 names_in_smaller_set_normalized[smaller].append(normalized_doublemetaphone_matching_score)
                 if normalized_doublemetaphone_matching_score == 0:
                     # if for the normalized score a perfect match was found we end our search here
@@ -752,8 +817,32 @@ MIN_TOTAL_SCORE_FOR_MATCH_WITH_PERFECT_RELATIVE_SCORE = 50
 
 TOTAL_MAX_SCORE_REACHABLE = FORENAME_MAX_SCORE_CONTRIBUTION + SURNAME_MAX_SCORE_CONTRIBUTION + BIRTH_PLACE_MAX_SCORE_CONTRIBUTION + BIRTH_DATE_MAX_SCORE_CONTRIBUTION + DEATH_PLACE_MAX_SCORE_CONTRIBUTION + DEATH_DATE_MAX_SCORE_CONTRIBUTION
 
+NAME_FIELDS = {
+    # field: is_surname
+    'forenames': False,
+    'surnames': True,
+    'birth_place': False,
+    'death_place': False,
+}
+DATE_FIELDS = ['birth_date', 'death_date']
+
+def prepare_data_set(data_set, normalizer=None):
+    '''
+        Normalizes all name and place values of a data set laid out as expected by get_matching_score,
+        so that they can be compared repeatedly by get_matching_score_for_prepared_data_sets.
+        An optional NameNormalizer memoizes the normalization of values repeating across data sets.
+    '''
+    prepared_data_set = {}
+    for field in NAME_FIELDS:
+        if field in data_set:
+            prepared_data_set[field] = get_names_as_dict(data_set[field], NAME_FIELDS[field], normalizer=normalizer)
+    for field in DATE_FIELDS:
+        if field in data_set:
+            prepared_data_set[field] = data_set[field]
+    return prepared_data_set
+
 
-def get_matching_score(local_data_set, external_data_set, values_to_be_disregarded={}):
+def get_matching_score(local_data_set, external_data_set, values_to_be_disregarded={}, shortform_index=None, name_graph=None, date_table=None, place_index=None, normalizer=None):
     '''
         Expected inputs: local_data_set and external_data_set:
         To get a complete match all values have to be provided.
@@ -766,6 +855,19 @@ def get_matching_score(local_data_set, external_data_set, values_to_be_disregard
             'death_place': ['Dachau'],
             'death_date': ['YYYY-MM-DD'],
         }
+        An optional ShortformIndex over the forename vocabulary caches the metaphone codes of the forenames,
+        an optional NameSimilarityGraph replaces the forename and surname comparisons by lookups. Name pairs
+        scoring at least the threshold of the graph aren't stored and score 1 instead of their real value, so
+        scores and automatic matches change, unless the graph was built with a threshold above 1.
+        an optional DateScoreTable memoizes the date comparisons
+        and an optional PlaceIndex replaces the place comparisons by id and hierarchy lookups where possible.
+        An optional NameNormalizer memoizes the normalization of names and places.
+    '''
+    return get_matching_score_for_prepared_data_sets(prepare_data_set(local_data_set, normalizer), prepare_data_set(external_data_set, normalizer), prepare_data_set(values_to_be_disregarded, normalizer), shortform_index, name_graph, date_table, place_index)
+
+def get_matching_score_for_prepared_data_sets(local_data_set, external_data_set, values_to_be_disregarded={}, shortform_index=None, name_graph=None, date_table=None, place_index=None):
+    '''
+        Same as get_matching_score for data sets that have already been passed through prepare_data_set.
     '''
     results = {}
     absolute_score = 0
@@ -782,19 +884,19 @@ def get_matching_score(local_data_set, external_data_set, values_to_be_disregard
     disregard_forenames = {}
     forename_results = {}
     if 'forenames' in local_data_set:
-        local_forenames = get_names_as_dict(local_data_set['forenames'], False)
+        local_forenames = local_data_set['forenames']
         forename_results['local'] = local_forenames
 
     if 'forenames' in external_data_set:
-        external_forenames = get_names_as_dict(external_data_set['forenames'], False)
+        external_forenames = external_data_set['forenames']
         forename_results['external'] = external_forenames
 
     if 'forenames' in values_to_be_disregarded:
-        disregard_forenames = get_names_as_dict(values_to_be_disregarded['forenames'], False)
+        disregard_forenames = values_to_be_disregarded['forenames']
         forename_results['disregard'] = disregard_forenames
 
     if len(local_forenames) > 0 and len(external_forenames) > 0:
-        forename_results = match_against_local_data(local_forenames, external_forenames, disregard_forenames, True)
+        forename_results = match_against_local_data(local_forenames, external_forenames, disregard_forenames, True, shortform_index, name_graph)
 
         forename_score = forename_results['score'] * FORENAME_MAX_SCORE_CONTRIBUTION
         max_score_reachable += FORENAME_MAX_SCORE_CONTRIBUTION
@@ -813,19 +915,19 @@ def get_matching_score(local_data_set, external_data_set, values_to_be_disregard
     disregard_surnames = {}
     surname_results = {}
     if 'surnames' in local_data_set:
-        local_surnames = get_names_as_dict(local_data_set['surnames'], True)
+        local_surnames = local_data_set['surnames']
         surname_results['local'] = local_surnames
 
     if 'surnames' in external_data_set:
-        external_surnames = get_names_as_dict(external_data_set['surnames'], True)
+        external_surnames = external_data_set['surnames']
         surname_results['external'] = external_surnames
 
     if 'surnames' in values_to_be_disregarded:
-        disregard_surnames = get_names_as_dict(values_to_be_disregarded['surnames'], True)
+        disregard_surnames = values_to_be_disregarded['surnames']
         surname_results['disregard'] = disregard_surnames
 
     if len(local_surnames) > 0 and len(external_surnames) > 0:
-        surname_results = match_against_local_data(local_surnames, external_surnames, disregard_surnames, False)
+        surname_results = match_against_local_data(local_surnames, external_surnames, disregard_surnames, False, name_graph=name_graph)
 
         surname_score = surname_results['score'] * SURNAME_MAX_SCORE_CONTRIBUTION
         max_score_reachable += SURNAME_MAX_SCORE_CONTRIBUTION
@@ -847,21 +949,24 @@ def get_matching_score(local_data_set, external_data_set, values_to_be_disregard
     disregard_birth_place = {}
     birth_place_results = {}
     if 'birth_place' in local_data_set:
-        local_birth_place = get_names_as_dict(local_data_set['birth_place'], False)
+        local_birth_place = local_data_set['birth_place']
         birth_place_results['local'] = local_birth_place
 
     if 'birth_place' in external_data_set:
-        external_birth_place = get_names_as_dict(external_data_set['birth_place'], False)
+        external_birth_place = external_data_set['birth_place']
         birth_place_results['external'] = external_birth_place
 
     if 'birth_place' in values_to_be_disregarded:
-        disregard_birth_place = get_names_as_dict(values_to_be_disregarded['birth_place'], False)
+        disregard_birth_place = values_to_be_disregarded['birth_place']
         birth_place_results['disregard'] = disregard_birth_place
 
     if len(local_birth_place) > 0 and len(external_birth_place) > 0:
-        birth_place_results = match_against_local_data(local_birth_place, external_birth_place, disregard_birth_place, True)
+        if place_index != None:
+            birth_place_results = place_index.match(local_birth_place, external_birth_place, disregard_birth_place)
+        else:
+            birth_place_results = match_against_local_data(local_birth_place, external_birth_place, disregard_birth_place, True)
 
-        birth_place_results['score'] = birth_place_results['smaller_data_set_score'] # Override the combined score with the one for the smaller data set only (As the place formating might differ to a great extend)
+            birth_place_results['score'] = birth_place_results['smaller_data_set_score'] # Override the combined score with the one for the smaller data set only (As the place formating might differ to a great extend)
 
         birth_place_score = birth_place_results['score'] * BIRTH_PLACE_MAX_SCORE_CONTRIBUTION
         max_score_reachable += BIRTH_PLACE_MAX_SCORE_CONTRIBUTION
@@ -889,7 +994,10 @@ def get_matching_score(local_data_set, external_data_set, values_to_be_disregard
 
     if len(local_birth_date) > 0 and len(external_birth_date) > 0:
 
-        birth_date_results = match_date_against_local_date(local_birth_date, external_birth_date)
+        if date_table != None:
+            birth_date_results = date_table.match(local_birth_date, external_birth_date)
+        else:
+            birth_date_results = match_date_against_local_date(local_birth_date, external_birth_date)
     
         birth_date_score = BIRTH_DATE_MAX_SCORE_CONTRIBUTION * birth_date_results['score']
         max_score_reachable += BIRTH_DATE_MAX_SCORE_CONTRIBUTION
@@ -910,22 +1018,25 @@ def get_matching_score(local_data_set, external_data_set, values_to_be_disregard
     disregard_death_place = {}
     death_place_results = {}
     if 'death_place' in local_data_set:
-        local_death_place = get_names_as_dict(local_data_set['death_place'], False)
+        local_death_place = local_data_set['death_place']
         death_place_results['local'] = local_death_place
 
     if 'death_place' in external_data_set:
-        external_death_place = get_names_as_dict(external_data_set['death_place'], False)
+        external_death_place = external_data_set['death_place']
         death_place_results['external'] = external_death_place
 
     if 'death_place' in values_to_be_disregarded:
-        disregard_death_place = get_names_as_dict(values_to_be_disregarded['death_place'], False)
+        disregard_death_place = values_to_be_disregarded['death_place']
         death_place_results['disregard'] = disregard_death_place
 
     if len(local_death_place) > 0 and len(external_death_place) > 0:
 
-        death_place_results = match_against_local_data(local_death_place, external_death_place, disregard_death_place, True)
+        if place_index != None:
+            death_place_results = place_index.match(local_death_place, external_death_place, disregard_death_place)
+        else:
+            death_place_results = match_against_local_data(local_death_place, external_death_place, disregard_death_place, True)
 
-        death_place_results['score'] = death_place_results['smaller_data_set_score']
+            death_place_results['score'] = death_place_results['smaller_data_set_score']
         death_place_score = death_place_results['score'] * DEATH_PLACE_MAX_SCORE_CONTRIBUTION
         max_score_reachable += DEATH_PLACE_MAX_SCORE_CONTRIBUTION
         absolute_score += death_place_score
@@ -951,7 +1062,10 @@ def get_matching_score(local_data_set, external_data_set, values_to_be_disregard
 
     if len(local_death_date) > 0 and len(external_death_date) > 0:
 
-        death_date_results = match_date_against_local_date(local_death_date, external_death_date)
+        if date_table != None:
+            death_date_results = date_table.match(local_death_date, external_death_date)
+        else:
+            death_date_results = match_date_against_local_date(local_death_date, external_death_date)
     
         death_date_score = DEATH_DATE_MAX_SCORE_CONTRIBUTION * death_date_results['score']
         max_score_reachable += DEATH_DATE_MAX_SCORE_CONTRIBUTION
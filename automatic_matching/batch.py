@@ -0,0 +1,140 @@
+import itertools
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from .automatic_matching_functions import get_matching_score
+from .pair_cache import get_record_fingerprint
+
+
+def score_candidate_pairs(candidate_pairs, local_records, external_records, values_to_be_disregarded={}, metrics=None, pair_cache=None):
+    '''
+        Scores (local_id, external_id) pairs against two dicts of record_id -> record.
+        Yields (local_id, external_id, result) with result as returned by get_matching_score.
+        With a PairResultCache, pairs with the same content as an earlier pair aren't scored again,
+        its hit statistics are added to metrics, if provided.
+    '''
+    get_score = lambda local_id, external_id: get_matching_score(local_records[local_id], external_records[external_id], values_to_be_disregarded)
+    if pair_cache != None:
+        local_fingerprints = {}
+        external_fingerprints = {}
+        disregard_fingerprint = get_record_fingerprint(values_to_be_disregarded)
+        if metrics != None and 'pairs' not in metrics.caches:
+            metrics.register_cache('pairs', pair_cache)
+
+        def get_score(local_id, external_id):
+            if local_id not in local_fingerprints:
+                local_fingerprints[local_id] = get_record_fingerprint(local_records[local_id])
+            if external_id not in external_fingerprints:
+                external_fingerprints[external_id] = get_record_fingerprint(external_records[external_id])
+            return pair_cache.get_matching_score(local_records[local_id], external_records[external_id], values_to_be_disregarded, local_fingerprints[local_id], external_fingerprints[external_id], disregard_fingerprint)
+
+    for local_id, external_id in candidate_pairs:
+        if metrics == None:
+            yield local_id, external_id, get_score(local_id, external_id)
+            continue
+        start = time.perf_counter()
+        result = get_score(local_id, external_id)
+        metrics.record_stage('score', time.perf_counter() - start)
+        metrics.add_scored()
+        yield local_id, external_id, result
+
+
+def get_result_summary(local_id, external_id, result):
+    '''
+        Reduces the result of get_matching_score to the values needed to persist a scored pair.
+    '''
+    return {
+        'local_id': local_id,
+        'external_id': external_id,
+        'absolute_score': float(result['absolute_score']),
+        'relative_score': float(result['relative_score']),
+        'total_relative_score': float(result['total_relative_score']),
+        'automatically_matched': result['automatically_matched'],
+        'matching_algorithm_version': result['matching_algorithm_version'],
+    }
+
+
+def score_record_pairs(record_pairs, values_to_be_disregarded={}):
+    '''
+        Scores a list of (local_id, external_id, local_record, external_record) tuples.
+        Used as unit of work by the thread and process pool scorers.
+    '''
+    return [(local_id, external_id, get_matching_score(local_record, external_record, values_to_be_disregarded)) for local_id, external_id, local_record, external_record in record_pairs]
+
+
+def score_record_pairs_timed(record_pairs, values_to_be_disregarded={}):
+    '''
+        Same as score_record_pairs, also returning the seconds taken by every pair.
+    '''
+    results = []
+    latencies = []
+    for local_id, external_id, local_record, external_record in record_pairs:
+        start = time.perf_counter()
+        results.append((local_id, external_id, get_matching_score(local_record, external_record, values_to_be_disregarded)))
+        latencies.append(time.perf_counter() - start)
+    return results, latencies
+
+
+def get_record_pair_chunks(candidate_pairs, local_records, external_records, chunk_size):
+    chunk = []
+    for local_id, external_id in candidate_pairs:
+        chunk.append((local_id, external_id, local_records[local_id], external_records[external_id]))
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if len(chunk) > 0:
+        yield chunk
+
+
+def score_candidate_pairs_in_pool(executor, candidate_pairs, local_records, external_records, values_to_be_disregarded={}, chunk_size=1000, metrics=None):
+    '''
+        Same as score_candidate_pairs, with chunks of pairs scored in the given concurrent.futures executor.
+        The results are yielded in the order of candidate_pairs.
+    '''
+    chunks = get_record_pair_chunks(candidate_pairs, local_records, external_records, chunk_size)
+    for results, latencies in executor.map(score_record_pairs_timed, chunks, itertools.repeat(values_to_be_disregarded)):
+        if metrics != None:
+            metrics.record_stage_latencies('score', latencies)
+            metrics.add_scored(len(results))
+        yield from results
+
+
+def score_candidate_pairs_threaded(candidate_pairs, local_records, external_records, values_to_be_disregarded={}, max_workers=None, chunk_size=1000, metrics=None):
+    '''
+        Scores candidate pairs in a thread pool. The scoring functions hold no shared mutable state
+        (every thread uses its own ICU transliterator), so this scales wherever the GIL is released,
+        i.e. in the native distance computations or on free threaded Python builds.
+    '''
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        yield from score_candidate_pairs_in_pool(executor, candidate_pairs, local_records, external_records, values_to_be_disregarded, chunk_size, metrics)
+
+
+def score_candidate_pairs_in_processes(candidate_pairs, local_records, external_records, values_to_be_disregarded={}, max_workers=None, chunk_size=1000, metrics=None):
+    '''
+        Scores candidate pairs in a process pool, the records of every chunk are pickled to the workers.
+    '''
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        yield from score_candidate_pairs_in_pool(executor, candidate_pairs, local_records, external_records, values_to_be_disregarded, chunk_size, metrics)
+
+
+def benchmark_thread_and_process_pools(candidate_pairs, local_records, external_records, values_to_be_disregarded={}, max_workers=None, chunk_size=1000):
+    '''
+        Compares serial scoring with the thread and process pool scorers and makes sure all of them return the same scores.
+    '''
+    candidate_pairs = list(candidate_pairs)
+    timings = {}
+    reference = None
+    for label, scorer, kwargs in [
+        ('serial', score_candidate_pairs, {}),
+        ('threads', score_candidate_pairs_threaded, {'max_workers': max_workers, 'chunk_size': chunk_size}),
+        ('processes', score_candidate_pairs_in_processes, {'max_workers': max_workers, 'chunk_size': chunk_size}),
+    ]:
+        start = time.perf_counter()
+        scores = [(local_id, external_id, result['absolute_score']) for local_id, external_id, result in scorer(candidate_pairs, local_records, external_records, values_to_be_disregarded, **kwargs)]
+        timings[label] = time.perf_counter() - start
+        if reference == None:
+            reference = scores
+        elif scores != reference:
+            raise AssertionError(f'{label} scoring returned different scores than serial scoring')
+        print(f'{label}: {timings[label]:.3f}s ({len(candidate_pairs) / timings[label]:.0f} pairs/s)')
+    return timings
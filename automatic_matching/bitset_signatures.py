@@ -0,0 +1,185 @@
+'''
+    Fixed width bitset signatures of the forenames and surnames of a whole database, for ranking candidates
+    by popcount before scoring them.
+
+    signatures = BitsetSignatures.from_records(external_records)
+    for local_id, external_id, result in score_top_candidates(local_records, external_records, signatures, top_fraction=0.001):
+        ...
+
+    Every record sets one bit per feature: the Double Metaphone codes and the padded q-grams of its normalized
+    forenames and surnames, each hashed with crc32 and prefixed with its field. The overlap of two records is the
+    Dice coefficient 2 * |a & b| / (|a| + |b|) of their bitsets. Features shared by both records always set shared
+    bits, so name pairs with many common features can't be ranked low, but hash collisions can raise unrelated
+    pairs. The overlap is therefore only used to decide which candidates are worth a get_matching_score call.
+'''
+import time
+import zlib
+
+import numpy as np
+from doublemetaphone import doublemetaphone
+
+from .automatic_matching_functions import get_matching_score, get_names_as_dict
+from .minhash_lsh import MINHASH_QGRAM_PADDING
+
+BITSET_SIGNATURE_DEFAULT_BITS = 256
+BITSET_SIGNATURE_DEFAULT_TOP_FRACTION = 0.01
+
+# number of set bits of every byte, used where np.bitwise_count isn't available (numpy < 2.0)
+POPCOUNT_TABLE = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def get_popcount(words):
+    '''
+        Returns the number of set bits of every element of a one dimensional uint64 array.
+    '''
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(words)
+    return POPCOUNT_TABLE[np.ascontiguousarray(words).view(np.uint8)].reshape(-1, 8).sum(axis=1, dtype=np.uint8)
+
+
+def get_popcounts(signatures, signature=None):
+    '''
+        Takes an array of shape (n, words) of uint64 and returns the number of set bits per row,
+        of the rows combined with signature by bitwise and, if provided. Summing up one word at a time
+        is considerably faster than a popcount over the whole array followed by a sum along its rows.
+    '''
+    counts = np.zeros(signatures.shape[0], dtype=np.int32)
+    for word in range(signatures.shape[1]):
+        column = signatures[:, word] if signature is None else signatures[:, word] & signature[word]
+        counts += get_popcount(column)
+    return counts
+
+
+def get_signature_features(record, q=2):
+    '''
+        Returns the set of hashed features of the forenames and surnames of a record.
+    '''
+    features = set()
+    for field, is_surname in [('forenames', False), ('surnames', True)]:
+        for name in get_names_as_dict(record.get(field, []), is_surname):
+            for code in doublemetaphone(name):
+                if len(code) > 0:
+                    features.add(f'{field}:dm:{code}')
+            padded = MINHASH_QGRAM_PADDING + name + MINHASH_QGRAM_PADDING
+            for i in range(max(len(padded) - q + 1, 1)):
+                features.add(f'{field}:{padded[i:i + q]}')
+    return features
+
+
+class BitsetSignatures:
+
+    def __init__(self, bits=BITSET_SIGNATURE_DEFAULT_BITS, q=2):
+        if bits % 64 != 0:
+            raise ValueError('The number of bits has to be a multiple of 64')
+        self.bits = bits
+        self.words = bits // 64
+        self.q = q
+        self.record_ids = []
+        self.signatures = np.zeros((0, self.words), dtype=np.uint64, order='F')
+        self.popcounts = np.zeros(0, dtype=np.int32)
+
+    def get_signature(self, record):
+        signature = np.zeros(self.words, dtype=np.uint64)
+        for feature in get_signature_features(record, self.q):
+            bit = zlib.crc32(feature.encode('utf-8')) % self.bits
+            signature[bit // 64] |= np.uint64(1) << np.uint64(bit % 64)
+        return signature
+
+    @classmethod
+    def from_records(cls, records, bits=BITSET_SIGNATURE_DEFAULT_BITS, q=2):
+        '''
+            Builds the signatures of a dict of record_id -> record, usually the external database.
+        '''
+        signatures = cls(bits, q)
+        signatures.record_ids = list(records)
+        # column major, so that every word of all signatures is contiguous in memory
+        signatures.signatures = np.asfortranarray(np.array([signatures.get_signature(records[record_id]) for record_id in signatures.record_ids], dtype=np.uint64).reshape(-1, signatures.words))
+        signatures.popcounts = get_popcounts(signatures.signatures)
+        return signatures
+
+    def __len__(self):
+        return len(self.record_ids)
+
+    def get_overlaps(self, signature):
+        '''
+            Returns the Dice coefficients of a signature with all stored signatures, 0 where both are empty.
+        '''
+        intersections = get_popcounts(self.signatures, signature)
+        totals = self.popcounts + get_popcounts(signature[None, :])[0]
+        return np.divide(2 * intersections, totals, out=np.zeros(len(totals)), where=totals > 0)
+
+    def get_top_indices(self, signature, top_fraction=BITSET_SIGNATURE_DEFAULT_TOP_FRACTION, min_candidates=1):
+        '''
+            Returns the indices of the top_fraction (at least min_candidates) stored signatures with the highest
+            overlap, best first, and their overlaps. Signatures without any overlap are never returned.
+        '''
+        overlaps = self.get_overlaps(signature)
+        count = min(max(int(np.ceil(top_fraction * len(overlaps))), min_candidates), len(overlaps))
+        if count == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        indices = np.argpartition(-overlaps, count - 1)[:count]
+        indices = indices[np.argsort(-overlaps[indices], kind='stable')]
+        indices = indices[overlaps[indices] > 0]
+        return indices, overlaps[indices]
+
+    def query(self, record, top_fraction=BITSET_SIGNATURE_DEFAULT_TOP_FRACTION, min_candidates=1):
+        '''
+            Returns a list of (record_id, overlap) of the best candidates for a record.
+        '''
+        indices, overlaps = self.get_top_indices(self.get_signature(record), top_fraction, min_candidates)
+        return [(self.record_ids[i], float(overlap)) for i, overlap in zip(indices, overlaps)]
+
+
+def score_top_candidates(local_records, external_records, signatures, top_fraction=BITSET_SIGNATURE_DEFAULT_TOP_FRACTION, min_candidates=1, values_to_be_disregarded={}):
+    '''
+        Scores every local record with get_matching_score against the top_fraction of the external records
+        ranked by signature overlap. signatures must have been built from external_records.
+        Yields (local_id, external_id, result) with result['signature_overlap'] set.
+    '''
+    for local_id in local_records:
+        for external_id, overlap in signatures.query(local_records[local_id], top_fraction, min_candidates):
+            result = get_matching_score(local_records[local_id], external_records[external_id], values_to_be_disregarded)
+            result['signature_overlap'] = overlap
+            yield local_id, external_id, result
+
+
+def benchmark_bitset_signatures(local_records, external_records, top_fraction=BITSET_SIGNATURE_DEFAULT_TOP_FRACTION, number_of_signatures=1000000, bits=BITSET_SIGNATURE_DEFAULT_BITS, values_to_be_disregarded={}):
+    '''
+        Measures the recall of the top_fraction candidates against all automatically matched pairs of the
+        cartesian product (so this should be run on a sample of the databases) and the time of a single query
+        against number_of_signatures signatures, made up by repeating the external signatures.
+    '''
+    automatically_matched_pairs = set()
+    for local_id in local_records:
+        for external_id in external_records:
+            if get_matching_score(local_records[local_id], external_records[external_id], values_to_be_disregarded)['automatically_matched']:
+                automatically_matched_pairs.add((local_id, external_id))
+
+    start = time.perf_counter()
+    signatures = BitsetSignatures.from_records(external_records, bits)
+    build_time = time.perf_counter() - start
+    candidates = set()
+    for local_id in local_records:
+        candidates.update((local_id, external_id) for external_id, overlap in signatures.query(local_records[local_id], top_fraction))
+    recall = len(candidates & automatically_matched_pairs) / len(automatically_matched_pairs) if len(automatically_matched_pairs) > 0 else 1
+
+    large_signatures = BitsetSignatures(bits)
+    repetitions = -(-number_of_signatures // max(len(signatures), 1))
+    large_signatures.signatures = np.asfortranarray(np.tile(signatures.signatures, (repetitions, 1))[:number_of_signatures])
+    large_signatures.popcounts = get_popcounts(large_signatures.signatures)
+    large_signatures.record_ids = list(range(len(large_signatures.signatures)))
+    query_signature = signatures.get_signature(next(iter(local_records.values())))
+    start = time.perf_counter()
+    large_signatures.get_top_indices(query_signature, top_fraction)
+    query_time = time.perf_counter() - start
+
+    print(f'built {len(signatures)} signatures in {build_time:.3f}s')
+    print(f'top {100 * top_fraction:.2f} %: {len(candidates)} candidates, recall {100 * recall:.2f} % of {len(automatically_matched_pairs)} automatic matches')
+    print(f'query against {len(large_signatures.signatures)} signatures: {1000 * query_time:.1f}ms (popcount: {"np.bitwise_count" if hasattr(np, "bitwise_count") else "lookup table"})')
+    return {
+        'build_time': build_time,
+        'candidates': len(candidates),
+        'recall': recall,
+        'query_time': query_time,
+        'number_of_signatures': len(large_signatures.signatures),
+    }
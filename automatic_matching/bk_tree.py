@@ -0,0 +1,156 @@
+import time
+
+from pyxdameraulevenshtein import damerau_levenshtein_distance, damerau_levenshtein_distance_seqs
+from rapidfuzz.distance import DamerauLevenshtein
+
+from .automatic_matching_functions import get_names_as_dict
+
+BK_TREE_NAME_FIELDS = [('forenames', False), ('surnames', True)]
+
+
+class BKTree:
+    '''
+        Burkhard-Keller tree answering "all values within edit distance k of this one".
+
+        damerau_levenshtein_distance (as used throughout the matching) computes the restricted
+        (optimal string alignment) distance, which violates the triangle inequality the tree relies on.
+        The tree is therefore organised by the unrestricted Damerau-Levenshtein distance, which is a metric
+        and never larger, and every hit is confirmed with damerau_levenshtein_distance. The results are
+        the same as those of a linear scan with damerau_levenshtein_distance.
+    '''
+
+    def __init__(self, values=[]):
+        self.root = None
+        self.size = 0
+        for value in values:
+            self.add(value)
+
+    def add(self, value):
+        if self.root == None:
+            self.root = (value, {})
+            self.size += 1
+            return
+        node = self.root
+        while True:
+            distance = DamerauLevenshtein.distance(value, node[0])
+            if distance == 0:
+                return
+            if distance not in node[1]:
+                node[1][distance] = (value, {})
+                self.size += 1
+                return
+            node = node[1][distance]
+
+    def search(self, value, max_distance):
+        '''
+            Returns a list of (value, distance) of all values within max_distance, sorted by distance.
+        '''
+        results = []
+        if self.root == None:
+            return results
+        nodes = [self.root]
+        while len(nodes) > 0:
+            node_value, children = nodes.pop()
+            distance = DamerauLevenshtein.distance(value, node_value)
+            if distance <= max_distance:
+                restricted_distance = damerau_levenshtein_distance(value, node_value)
+                if restricted_distance <= max_distance:
+                    results.append((node_value, restricted_distance))
+            for child_distance in children:
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    nodes.append(children[child_distance])
+        return sorted(results, key=lambda x: x[1])
+
+    def __len__(self):
+        return self.size
+
+
+class NameBKTreeIndex:
+    '''
+        Candidate generator over the original and normalized forenames and surnames of a database.
+        Exact hits are answered by a dict lookup, near exact hits by one BK-tree per field.
+    '''
+
+    def __init__(self):
+        self.record_ids = {field: {} for field, is_surname in BK_TREE_NAME_FIELDS}
+        self.trees = {field: BKTree() for field, is_surname in BK_TREE_NAME_FIELDS}
+
+    @staticmethod
+    def get_names(record, field, is_surname):
+        names = get_names_as_dict(record.get(field, []), is_surname)
+        result = set(names)
+        for normalized in names:
+            result.update(names[normalized])
+        return result
+
+    def add(self, record_id, record):
+        for field, is_surname in BK_TREE_NAME_FIELDS:
+            for name in self.get_names(record, field, is_surname):
+                if name not in self.record_ids[field]:
+                    self.record_ids[field][name] = set()
+                    self.trees[field].add(name)
+                self.record_ids[field][name].add(record_id)
+
+    @classmethod
+    def from_records(cls, records):
+        index = cls()
+        for record_id in records:
+            index.add(record_id, records[record_id])
+        return index
+
+    def get_exact_matches(self, name, field='surnames'):
+        return self.record_ids[field].get(name, set())
+
+    def get_similar_names(self, name, max_distance=1, field='surnames'):
+        if max_distance == 0:
+            return [(name, 0)] if name in self.record_ids[field] else []
+        return self.trees[field].search(name, max_distance)
+
+    def get_candidates(self, record, max_distance=1, fields=['surnames']):
+        '''
+            Returns the ids of all indexed records with a name within max_distance of one of the record's names.
+        '''
+        candidates = set()
+        for field, is_surname in BK_TREE_NAME_FIELDS:
+            if field not in fields:
+                continue
+            for name in self.get_names(record, field, is_surname):
+                for similar_name, distance in self.get_similar_names(name, max_distance, field):
+                    candidates.update(self.record_ids[field][similar_name])
+        return candidates
+
+    def get_candidate_pairs(self, local_records, max_distance=1, fields=['surnames']):
+        for local_id in local_records:
+            for external_id in self.get_candidates(local_records[local_id], max_distance, fields):
+                yield local_id, external_id
+
+
+def benchmark_bk_tree(names, queries, max_distance=1):
+    '''
+        Compares BK-tree lookups with a linear scan using damerau_levenshtein_distance_seqs
+        and makes sure both return the same names.
+    '''
+    names = list(dict.fromkeys(names))
+    start = time.perf_counter()
+    tree = BKTree(names)
+    build_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    tree_results = [set(x[0] for x in tree.search(query, max_distance)) for query in queries]
+    tree_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    linear_results = []
+    for query in queries:
+        distances = damerau_levenshtein_distance_seqs(query, names)
+        linear_results.append(set(name for name, distance in zip(names, distances) if distance <= max_distance))
+    linear_time = time.perf_counter() - start
+
+    mismatches = sum(1 for x, y in zip(tree_results, linear_results) if x != y)
+    print(f'{len(queries)} queries against {len(names)} names (k={max_distance}): BK-tree {tree_time:.3f}s (build {build_time:.3f}s), linear scan {linear_time:.3f}s, {mismatches} mismatches')
+    return {
+        'build_time': build_time,
+        'bk_tree_time': tree_time,
+        'linear_scan_time': linear_time,
+        'mismatches': mismatches,
+    }
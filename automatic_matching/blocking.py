@@ -0,0 +1,73 @@
+from doublemetaphone import doublemetaphone
+
+from .automatic_matching_functions import get_names_as_dict
+
+RECORD_ID_FIELD = 'id'
+
+
+def get_blocking_keys(record):
+    '''
+        Returns the blocking keys of a record: the primary Double Metaphone codes of its normalized surnames.
+        A record with several surnames (e.g. birth names) ends up in several blocks, records without
+        surnames don't get a blocking key and are therefore never compared.
+    '''
+    keys = set()
+    for surname in get_names_as_dict(record.get('surnames', []), True):
+        code = doublemetaphone(surname)[0]
+        if len(code) > 0:
+            keys.add(code)
+    return sorted(keys)
+
+
+def get_blocks(records):
+    '''
+        Takes a dict of record_id -> record and returns a dict of blocking_key -> list of record ids.
+    '''
+    blocks = {}
+    for record_id in records:
+        for key in get_blocking_keys(records[record_id]):
+            if key not in blocks:
+                blocks[key] = []
+            blocks[key].append(record_id)
+    return blocks
+
+
+def get_block_positions(blocks, keys):
+    '''
+        Returns a dict of record_id -> ascending positions in keys of the blocks containing the record.
+    '''
+    positions = {}
+    for position, key in enumerate(keys):
+        for record_id in blocks[key]:
+            if record_id not in positions:
+                positions[record_id] = []
+            positions[record_id].append(position)
+    return positions
+
+
+def get_candidate_pairs_from_blocks(local_blocks, external_blocks, keys=None):
+    '''
+        Yields every (local_id, external_id) pair sharing at least one blocking key exactly once,
+        even if both records share several keys. keys optionally restricts the blocks to be used.
+        A pair is yielded from the first block containing both records, so the memory needed is linear
+        in the number of records, not in the number of pairs.
+    '''
+    if keys == None:
+        keys = local_blocks.keys()
+    keys = [key for key in keys if key in local_blocks and key in external_blocks]
+    local_positions = get_block_positions(local_blocks, keys)
+    external_positions = {record_id: set(positions) for record_id, positions in get_block_positions(external_blocks, keys).items()}
+    for position, key in enumerate(keys):
+        for local_id in local_blocks[key]:
+            earlier_positions = local_positions[local_id][:local_positions[local_id].index(position)]
+            for external_id in external_blocks[key]:
+                if any(x in external_positions[external_id] for x in earlier_positions):
+                    continue
+                yield local_id, external_id
+
+
+def get_candidate_pairs(local_records, external_records):
+    '''
+        Takes two dicts of record_id -> record and yields all (local_id, external_id) pairs sharing a blocking key.
+    '''
+    return get_candidate_pairs_from_blocks(get_blocks(local_records), get_blocks(external_records))
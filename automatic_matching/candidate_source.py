@@ -0,0 +1,160 @@
+'''
+    Rescoring of candidates retrieved from a search backend, e.g. an Elasticsearch index of the local database.
+
+    with InMemoryCandidateSource(local_records) as source:
+        for external_id, local_id, result in score_candidates_from_source(source, external_records):
+            ...
+
+    A source answers a whole batch of query records per request and keeps its connection open between
+    open() and close(). score_candidates_from_source fetches the next batches in background threads while
+    the current batch is scored. The score of the source is stored as 'es_score' in every result, which
+    get_result_as_html_table_row shows in an extra column.
+'''
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .automatic_matching_functions import get_matching_score, get_names_as_dict
+from .blocking import RECORD_ID_FIELD, get_blocking_keys, get_blocks
+
+CANDIDATE_SOURCE_DEFAULT_BATCH_SIZE = 100
+CANDIDATE_SOURCE_DEFAULT_MAX_CANDIDATES = 20
+
+
+class CandidateSource:
+    '''
+        Interface of a candidate source. Implementations override fetch_batch and, if they hold a connection
+        or client, open and close. fetch_batch may be called from several threads at the same time.
+    '''
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def fetch_batch(self, query_records):
+        '''
+            Takes a list of query records and returns a list with one entry per query record:
+            a list of (candidate_record, source_score) tuples, best candidates first.
+        '''
+        raise NotImplementedError
+
+
+class InMemoryCandidateSource(CandidateSource):
+    '''
+        Reference implementation without network access: candidates share a blocking key with the query record
+        and are ranked by the number of normalized forenames and surnames they have in common.
+    '''
+
+    def __init__(self, records, max_candidates=CANDIDATE_SOURCE_DEFAULT_MAX_CANDIDATES, latency=0):
+        self.records = records
+        self.max_candidates = max_candidates
+        self.latency = latency # seconds per batch, to simulate the round trip to a remote backend
+        self.blocks = None
+        self.requests = 0
+
+    def open(self):
+        if self.blocks == None:
+            self.blocks = get_blocks(self.records)
+
+    def close(self):
+        self.blocks = None
+
+    def get_name_tokens(self, record):
+        return set(get_names_as_dict(record.get('forenames', []), False)) | set(get_names_as_dict(record.get('surnames', []), True))
+
+    def fetch_batch(self, query_records):
+        if self.blocks == None:
+            raise RuntimeError('The candidate source has to be opened before fetching candidates')
+        self.requests += 1
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+        results = []
+        for query_record in query_records:
+            candidate_ids = set()
+            for key in get_blocking_keys(query_record):
+                candidate_ids.update(self.blocks.get(key, []))
+            query_tokens = self.get_name_tokens(query_record)
+            candidates = [(self.records[record_id], float(len(query_tokens & self.get_name_tokens(self.records[record_id])))) for record_id in candidate_ids]
+            candidates.sort(key=lambda x: (-x[1], str(x[0][RECORD_ID_FIELD])))
+            results.append(candidates[:self.max_candidates])
+        return results
+
+
+def get_query_batches(query_records, batch_size):
+    batch = []
+    for query_record in query_records:
+        batch.append(query_record)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if len(batch) > 0:
+        yield batch
+
+
+def score_fetched_batch(batch, future, values_to_be_disregarded={}, metrics=None):
+    start = time.perf_counter()
+    batch_candidates = future.result()
+    if metrics != None:
+        metrics.record_stage('fetch_wait', time.perf_counter() - start)
+
+    for query_record, candidates in zip(batch, batch_candidates):
+        for candidate_record, source_score in candidates:
+            start = time.perf_counter()
+            result = get_matching_score(candidate_record, query_record, values_to_be_disregarded)
+            result['es_score'] = source_score
+            if metrics != None:
+                metrics.record_stage('score', time.perf_counter() - start)
+                metrics.add_scored()
+            yield query_record[RECORD_ID_FIELD], candidate_record[RECORD_ID_FIELD], result
+
+
+def score_candidates_from_source(source, query_records, values_to_be_disregarded={}, batch_size=CANDIDATE_SOURCE_DEFAULT_BATCH_SIZE, prefetch_batches=2, metrics=None):
+    '''
+        Retrieves candidates for an iterable of (external) query records from an opened source in batches of
+        batch_size and scores them with get_matching_score, the candidates being the local data sets.
+        Up to prefetch_batches requests are in flight while the current batch is scored.
+
+        Yields (query_id, candidate_id, result) in the order of query_records and candidates,
+        with result['es_score'] set to the score of the source.
+    '''
+    batches = get_query_batches(query_records, batch_size)
+    with ThreadPoolExecutor(max_workers=max(prefetch_batches, 1)) as executor:
+        pending = []
+        for batch in batches:
+            pending.append((batch, executor.submit(source.fetch_batch, batch)))
+            if len(pending) <= prefetch_batches:
+                continue
+            yield from score_fetched_batch(*pending.pop(0), values_to_be_disregarded, metrics)
+        while len(pending) > 0:
+            yield from score_fetched_batch(*pending.pop(0), values_to_be_disregarded, metrics)
+
+
+def benchmark_candidate_source(source, query_records, values_to_be_disregarded={}, batch_size=CANDIDATE_SOURCE_DEFAULT_BATCH_SIZE):
+    '''
+        Compares one request per query record without prefetching against batched requests with prefetching.
+    '''
+    query_records = list(query_records)
+    timings = {}
+    reference = None
+    for label, kwargs in [
+        ('serial', {'batch_size': 1, 'prefetch_batches': 0}),
+        ('batched', {'batch_size': batch_size, 'prefetch_batches': 2}),
+    ]:
+        start = time.perf_counter()
+        scores = [(query_id, candidate_id, result['absolute_score']) for query_id, candidate_id, result in score_candidates_from_source(source, query_records, values_to_be_disregarded, **kwargs)]
+        timings[label] = time.perf_counter() - start
+        if reference == None:
+            reference = scores
+        elif scores != reference:
+            raise AssertionError(f'{label} scoring returned different scores than serial scoring')
+        print(f'{label}: {timings[label]:.3f}s for {len(scores)} pairs')
+    return timings
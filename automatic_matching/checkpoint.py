@@ -0,0 +1,135 @@
+'''
+    Checkpointed database to database linkage, a run that crashed or was preempted continues where it stopped.
+
+    from automatic_matching.checkpoint import run_linkage_with_checkpoints, read_checkpoint_results
+    run_linkage_with_checkpoints(local_records, external_records, 'run/')   (rerun the same call to resume)
+    for row in read_checkpoint_results('run/'):
+        ...
+
+    The candidate pairs are split into chunks of chunk_size pairs in a deterministic order. Every finished
+    chunk is written atomically to its own file, so a chunk file is either complete or missing and a resumed
+    run only scores the missing chunks. Only one chunk of pairs is held in memory at a time, the results are
+    read back from the chunk files one row at a time. The manifest records the matching algorithm version and fingerprints
+    of the inputs, resuming with different records, values to be disregarded or another algorithm version is refused.
+'''
+import hashlib
+import itertools
+import json
+import os
+
+from .automatic_matching_functions import AUTOMATIC_MATCHING_ALGORITHM_VERSION_STRING
+from .blocking import get_blocks, get_candidate_pairs_from_blocks
+from .batch import score_candidate_pairs, get_result_summary
+from .sharding import write_jsonl_atomically
+
+CHECKPOINT_MANIFEST_FILE_NAME = 'manifest.json'
+CHECKPOINT_DEFAULT_CHUNK_SIZE = 10000
+
+
+def get_records_fingerprint(records):
+    '''
+        Returns a SHA-256 hex digest of a dict of record_id -> record, depending on the order of the records
+        as the order of the candidate pairs and thereby the chunks does as well.
+    '''
+    digest = hashlib.sha256()
+    for record_id, record in records.items():
+        digest.update(json.dumps([record_id, record], sort_keys=True, ensure_ascii=False).encode('utf-8'))
+        digest.update(b'\n')
+    return digest.hexdigest()
+
+
+def get_values_fingerprint(values):
+    return hashlib.sha256(json.dumps(values, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+def get_chunk_file_path(directory, chunk):
+    return os.path.join(directory, f'chunk-{chunk:07d}.results.jsonl')
+
+
+def get_checkpoint_manifest(local_records, external_records, values_to_be_disregarded, chunk_size, number_of_pairs):
+    return {
+        'matching_algorithm_version': AUTOMATIC_MATCHING_ALGORITHM_VERSION_STRING,
+        'local_records_fingerprint': get_records_fingerprint(local_records),
+        'external_records_fingerprint': get_records_fingerprint(external_records),
+        'values_to_be_disregarded_fingerprint': get_values_fingerprint(values_to_be_disregarded),
+        'chunk_size': chunk_size,
+        'number_of_pairs': number_of_pairs,
+        'number_of_chunks': (number_of_pairs + chunk_size - 1) // chunk_size,
+    }
+
+
+def read_checkpoint_manifest(directory):
+    path = os.path.join(directory, CHECKPOINT_MANIFEST_FILE_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def write_checkpoint_manifest(directory, manifest):
+    path = os.path.join(directory, CHECKPOINT_MANIFEST_FILE_NAME)
+    temporary_path = path + '.tmp'
+    with open(temporary_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(temporary_path, path)
+
+
+def get_completed_chunks(directory, manifest):
+    return [chunk for chunk in range(manifest['number_of_chunks']) if os.path.exists(get_chunk_file_path(directory, chunk))]
+
+
+def read_chunk_files(directory, number_of_chunks):
+    for chunk in range(number_of_chunks):
+        with open(get_chunk_file_path(directory, chunk), encoding='utf-8') as f:
+            for line in f:
+                yield json.loads(line)
+
+
+def read_checkpoint_results(directory):
+    '''
+        Returns an iterator over the result summaries of all chunks in chunk order,
+        raises a FileNotFoundError if any chunk is missing.
+    '''
+    manifest = read_checkpoint_manifest(directory)
+    if manifest == None:
+        raise FileNotFoundError(f'No checkpoint manifest in {directory}')
+    missing_chunks = sorted(set(range(manifest['number_of_chunks'])) - set(get_completed_chunks(directory, manifest)))
+    if len(missing_chunks) > 0:
+        raise FileNotFoundError(f'Missing results for chunks: {", ".join(str(x) for x in missing_chunks)}')
+    return read_chunk_files(directory, manifest['number_of_chunks'])
+
+
+def run_linkage_with_checkpoints(local_records, external_records, directory, values_to_be_disregarded={}, chunk_size=CHECKPOINT_DEFAULT_CHUNK_SIZE, metrics=None):
+    '''
+        Scores all candidate pairs of two dicts of record_id -> record that share a blocking key and
+        checkpoints every chunk of chunk_size pairs to directory. Chunks already present in directory
+        are skipped. Returns the number of pairs, their result summaries (see get_result_summary) can be
+        read with read_checkpoint_results.
+    '''
+    os.makedirs(directory, exist_ok=True)
+    local_blocks = get_blocks(local_records)
+    external_blocks = get_blocks(external_records)
+    number_of_pairs = sum(1 for _ in get_candidate_pairs_from_blocks(local_blocks, external_blocks))
+    manifest = get_checkpoint_manifest(local_records, external_records, values_to_be_disregarded, chunk_size, number_of_pairs)
+
+    existing_manifest = read_checkpoint_manifest(directory)
+    if existing_manifest == None:
+        write_checkpoint_manifest(directory, manifest)
+    elif existing_manifest != manifest:
+        different = [key for key in manifest if manifest[key] != existing_manifest.get(key)]
+        raise ValueError(f'The checkpoint in {directory} belongs to a different run ({", ".join(different)} differ)')
+
+    completed_chunks = set(get_completed_chunks(directory, manifest))
+    if metrics != None:
+        metrics.total_pairs = number_of_pairs - sum(min(chunk_size, number_of_pairs - chunk * chunk_size) for chunk in completed_chunks)
+
+    # the pairs are generated in the same order on every run, the pairs of completed chunks are skipped
+    candidate_pairs = get_candidate_pairs_from_blocks(local_blocks, external_blocks)
+    for chunk in range(manifest['number_of_chunks']):
+        chunk_pairs = list(itertools.islice(candidate_pairs, chunk_size))
+        if chunk in completed_chunks:
+            continue
+        scored_pairs = score_candidate_pairs(chunk_pairs, local_records, external_records, values_to_be_disregarded, metrics)
+        write_jsonl_atomically(get_chunk_file_path(directory, chunk), (get_result_summary(*x) for x in scored_pairs))
+
+    return number_of_pairs
@@ -0,0 +1,118 @@
+'''
+    Compact binary output for large numbers of scored pairs.
+
+    Every column is written as a raw little endian array into its own file, record ids and
+    algorithm versions are stored as integer codes into tables kept in columns.json.
+    The reader memory maps the column files, so that they can be filtered without loading them.
+
+    with ColumnarResultWriter('results/') as writer:
+        writer.write_batch(score_candidate_pairs(...))
+
+    results = read_columnar_results('results/')
+    matched = results['columns']['automatically_matched'] == 1
+'''
+import json
+import os
+
+import numpy as np
+
+COLUMNAR_OUTPUT_METADATA_FILE_NAME = 'columns.json'
+
+COLUMNAR_OUTPUT_FIELDS = ['forename', 'surname', 'birth_place', 'birth_date', 'death_place', 'death_date']
+
+COLUMNAR_OUTPUT_COLUMNS = {
+    'local_id': '<i8',
+    'external_id': '<i8',
+    'absolute_score': '<f8',
+    'relative_score': '<f8',
+    'total_relative_score': '<f8',
+    **{f'{field}_score': '<f4' for field in COLUMNAR_OUTPUT_FIELDS}, # NaN if the field could not be compared
+    'automatically_matched': 'u1',
+    'matching_algorithm_version': 'u1',
+}
+
+
+class ColumnarResultWriter:
+    '''
+        Streams batches of (local_id, external_id, result) triples, with result as returned by
+        get_matching_score, into one binary file per column.
+    '''
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.number_of_rows = 0
+        self.local_ids = {}
+        self.external_ids = {}
+        self.versions = {}
+        self.files = {column: open(self.get_column_path(column), 'wb') for column in COLUMNAR_OUTPUT_COLUMNS}
+
+    def get_column_path(self, column):
+        return os.path.join(self.directory, f'{column}.bin')
+
+    def get_code(self, table, value):
+        if value not in table:
+            table[value] = len(table)
+        return table[value]
+
+    def write_batch(self, scored_pairs):
+        columns = {column: [] for column in COLUMNAR_OUTPUT_COLUMNS}
+        for local_id, external_id, result in scored_pairs:
+            columns['local_id'].append(self.get_code(self.local_ids, local_id))
+            columns['external_id'].append(self.get_code(self.external_ids, external_id))
+            columns['absolute_score'].append(result['absolute_score'])
+            columns['relative_score'].append(result['relative_score'])
+            columns['total_relative_score'].append(result['total_relative_score'])
+            for field in COLUMNAR_OUTPUT_FIELDS:
+                columns[f'{field}_score'].append(result.get(field, {}).get('score', np.nan))
+            columns['automatically_matched'].append(result['automatically_matched'])
+            columns['matching_algorithm_version'].append(self.get_code(self.versions, result['matching_algorithm_version']))
+
+        for column, dtype in COLUMNAR_OUTPUT_COLUMNS.items():
+            self.files[column].write(np.asarray(columns[column], dtype=dtype).tobytes())
+        self.number_of_rows += len(columns['local_id'])
+
+    def close(self):
+        if self.files == None:
+            return
+        for f in self.files.values():
+            f.close()
+        self.files = None
+        with open(os.path.join(self.directory, COLUMNAR_OUTPUT_METADATA_FILE_NAME), 'w', encoding='utf-8') as f:
+            json.dump({
+                'number_of_rows': self.number_of_rows,
+                'columns': COLUMNAR_OUTPUT_COLUMNS,
+                'local_ids': list(self.local_ids),
+                'external_ids': list(self.external_ids),
+                'matching_algorithm_versions': list(self.versions),
+            }, f, ensure_ascii=False)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def read_columnar_results(directory):
+    '''
+        Opens the output of a ColumnarResultWriter. The columns are returned as read only memory maps,
+        local_ids, external_ids and matching_algorithm_versions map the integer codes back to their values.
+    '''
+    with open(os.path.join(directory, COLUMNAR_OUTPUT_METADATA_FILE_NAME), encoding='utf-8') as f:
+        metadata = json.load(f)
+
+    columns = {}
+    for column, dtype in metadata['columns'].items():
+        if metadata['number_of_rows'] == 0:
+            columns[column] = np.zeros(0, dtype=dtype)
+        else:
+            columns[column] = np.memmap(os.path.join(directory, f'{column}.bin'), dtype=dtype, mode='r', shape=(metadata['number_of_rows'],))
+
+    return {
+        'number_of_rows': metadata['number_of_rows'],
+        'columns': columns,
+        'local_ids': metadata['local_ids'],
+        'external_ids': metadata['external_ids'],
+        'matching_algorithm_versions': metadata['matching_algorithm_versions'],
+    }
@@ -0,0 +1,69 @@
+import threading
+
+from .automatic_matching_functions import convert_dates, merge_converted_dates, match_converted_dates
+
+DATE_SCORE_TABLE_DEFAULT_MAX_SIZE = 1000000
+
+
+class DateScoreTable:
+    '''
+        Memoizes date comparisons for databases with a small number of distinct date strings.
+
+        Every date string is interned to an id and parsed by convert_dates only once, the results of
+        match_date_against_local_date are stored per pair of date id tuples. Once max_size results are
+        stored, further results are computed but no longer stored.
+        The table can be shared between threads.
+    '''
+
+    def __init__(self, max_size=DATE_SCORE_TABLE_DEFAULT_MAX_SIZE):
+        self.max_size = max_size
+        self.date_ids = {}
+        self.converted_dates = []
+        self.scores = {}
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get_date_id(self, date_string):
+        date_id = self.date_ids.get(date_string, None)
+        if date_id == None:
+            converted_dates = convert_dates([date_string])
+            with self.lock:
+                if date_string not in self.date_ids:
+                    self.date_ids[date_string] = len(self.converted_dates)
+                    self.converted_dates.append(converted_dates)
+                date_id = self.date_ids[date_string]
+        return date_id
+
+    def get_converted_dates(self, date_ids):
+        if len(date_ids) == 1:
+            return self.converted_dates[date_ids[0]]
+        return merge_converted_dates([self.converted_dates[date_id] for date_id in date_ids])
+
+    def match(self, local_dates, external_dates):
+        '''
+            Same results as match_date_against_local_date(local_dates, external_dates).
+        '''
+        local_date_ids = tuple(self.get_date_id(x) for x in local_dates)
+        external_date_ids = tuple(self.get_date_id(x) for x in external_dates)
+        key = (local_date_ids, external_date_ids)
+        result = self.scores.get(key, None)
+        if result != None:
+            with self.lock:
+                self.hits += 1
+        else:
+            result = match_converted_dates(local_dates, external_dates, self.get_converted_dates(local_date_ids), self.get_converted_dates(external_date_ids))
+            with self.lock:
+                self.misses += 1
+                if len(self.scores) < self.max_size:
+                    self.scores[key] = result
+        # callers add their absolute scores to the result, the stored one must not be modified
+        return dict(result)
+
+    def get_statistics(self):
+        return {
+            'distinct_dates': len(self.date_ids),
+            'stored_results': len(self.scores),
+            'hits': self.hits,
+            'misses': self.misses,
+        }
@@ -0,0 +1,370 @@
+'''
+    Differential testing of alternative scoring engines against the reference implementation.
+
+    An engine is any callable with the signature of the reference function it replaces. It is run side by
+    side with the reference on a golden corpus, every divergence beyond the float tolerance is reported
+    together with the throughput of both.
+
+    report = run_differential_test(my_get_matching_score, get_matching_score_cases())
+    report = run_name_differential_test(my_match_names)
+    report = run_date_differential_test(my_match_dates)
+'''
+import json
+import numbers
+import random
+import time
+
+from .automatic_matching_functions import (
+    get_matching_score, get_names_as_dict, match_against_local_data, match_date_against_local_date,
+    TTP_MATCHING_DEFAULT_DISREGARD_VALUES,
+)
+
+# absolute scores are sums of weighted floats, summing them in another order changes the last digits only
+EQUIVALENCE_DEFAULT_TOLERANCE = 1e-9
+EQUIVALENCE_MAX_REPORTED_DIVERGENCES = 20
+
+# the examples of Automatic Matching Examples.ipynb
+GOLDEN_CORPUS_NOTEBOOK_PAIRS = [
+    {
+        'name': f'notebook glaessner {i}',
+        'local': {'forenames': ['Margarethe', 'Margarete'], 'surnames': ['Glaessner', 'Glässner', 'Loewy'], 'birth_place': ['München'], 'birth_date': ['1891-09-09'], 'death_date': ['1941-12-11']},
+        'external': external,
+        'values_to_be_disregarded': {},
+    } for i, external in enumerate([
+        {'forenames': ['Margarete'], 'surnames': ['Glaessner', 'Loewy'], 'birth_place': ['München', 'Bavaria'], 'birth_date': ['1891-09-09']},
+        {'forenames': ['Grete'], 'surnames': ['Abeles', 'Loewy'], 'birth_place': ['München', 'Bavaria'], 'birth_date': ['1897-09-09']},
+        {'forenames': ['Grete'], 'surnames': ['Glaesner', 'Loewy'], 'birth_place': ['München', 'Bavaria'], 'birth_date': ['1891-11-08'], 'death_place': ['Auschwitz']},
+    ])
+] + [
+    {
+        'name': 'notebook abrehamsohn',
+        'local': {'forenames': ['Alex', 'Israel'], 'surnames': ['abrehamsohn'], 'birth_place': ['München'], 'birth_date': ['1923-02-01'], 'death_place': ['Dachau'], 'death_date': ['1942-11-01']},
+        'external': {'forenames': ['Alexander'], 'surnames': ['abrahams'], 'birth_place': ['München', 'Bavaria'], 'birth_date': ['1922-11-11'], 'death_place': ['Dachau'], 'death_date': ['1943-02-02']},
+        'values_to_be_disregarded': {'forenames': ['Israel']},
+    },
+] + [
+    {
+        'name': f'notebook hanns cohn {i}',
+        'local': {'forenames': ['Hanns'], 'surnames': ['Cohn'], 'birth_place': ['Berlin', 'Stadt Berlin'], 'birth_date': ['1923-11-27'], 'death_place': ['Auschwitz'], 'death_date': ['<1945-05-08']},
+        'external': external,
+        'values_to_be_disregarded': {},
+    } for i, external in enumerate([
+        {'forenames': ['Hans'], 'surnames': ['Cohn'], 'birth_place': ['Berlin'], 'birth_date': ['1923-11-27']},
+        {'forenames': ['L', 'Hans'], 'surnames': ['Cohn'], 'birth_date': ['1924-02-13']},
+        {'forenames': ['Hanna'], 'surnames': ['Kohn'], 'birth_date': ['1924-05-05']},
+        {'forenames': ['Hanna'], 'surnames': ['Kohn'], 'birth_date': ['1924-**-**'], 'death_place': []},
+    ])
+] + [
+    {
+        'name': f'notebook hans cohn siegeburg {i}',
+        'local': {'forenames': ['Hans'], 'surnames': ['Cohn'], 'birth_date': ['1921-01-19'], 'death_place': ['Siegeburg'], 'death_date': ['1936-12-12']},
+        'external': external,
+        'values_to_be_disregarded': {},
+    } for i, external in enumerate([
+        {'forenames': ['Hans', 'M'], 'surnames': ['Cohn'], 'birth_date': ['1920-12-27']},
+        {'forenames': ['Hans'], 'surnames': ['Kohn'], 'birth_date': ['1920-06-15'], 'birth_place': ['Wien']},
+        {'forenames': ['Hans'], 'surnames': ['Cohn'], 'birth_date': ['1920-12-27']},
+        {'forenames': ['Hans'], 'surnames': ['Coen'], 'birth_date': ['1921-02-02']},
+    ])
+] + [
+    {
+        'name': 'notebook gohn',
+        'local': {'forenames': ['Hans'], 'surnames': ['Cohn'], 'birth_date': ['1903-10-02']},
+        'external': {'forenames': ['Hans'], 'surnames': ['Gohn'], 'birth_date': ['1903-11-01']},
+        'values_to_be_disregarded': {},
+    },
+] + [
+    {
+        'name': f'notebook {surname.lower()} cottbus {i}',
+        'local': {'forenames': ['Hans'], 'surnames': [surname], 'birth_date': ['1896-01-07'], 'birth_place': ['Cottbus', 'Mark', 'Brandenburg']},
+        'external': external,
+        'values_to_be_disregarded': {},
+    } for surname in ['Cohn', 'Cohnova'] for i, external in enumerate([
+        {'forenames': ['Hans'], 'surnames': ['Cohn'], 'birth_date': ['1896-01-07']},
+        {'forenames': ['Hans'], 'surnames': ['Kohn'], 'birth_date': ['1905-03-30']},
+    ])
+] + [
+    {
+        'name': 'notebook ansbacher',
+        'local': {'forenames': ['Elsa'], 'surnames': ['Ansbacher', 'Gidion'], 'birth_date': ['1893-10-27'], 'birth_place': ['Nordstetten']},
+        'external': {'forenames': ['Elise'], 'surnames': ['Ansbacher', 'Cohn'], 'birth_date': ['1893-10-27']},
+        'values_to_be_disregarded': TTP_MATCHING_DEFAULT_DISREGARD_VALUES,
+    },
+]
+
+# the dates of the date comparison example of the notebook, all compared with 1921-12-01
+GOLDEN_CORPUS_NOTEBOOK_DATES = [
+    '1912-01-01', '1921-01-12', '1927-01-01', '1920-12-30', '1927-01-12',
+    '1921-02-11', '1912-11-02', '1921-07-07', '1920-12-31', '1921-01-21',
+    '1912-10-10', '1921-10-10', '1921-10-01', '1921-01-31', '1921-01-12',
+    '1921-11-01', '1912-11-11', '1912-**-**', '1912-01-**', '1912-02-**',
+]
+
+GOLDEN_CORPUS_FORENAMES = ['Hans', 'Hanns', 'Johann', 'Johannes', 'Margarete', 'Margarethe', 'Grete', 'Elsa', 'Elise', 'Alexander', 'Alex', 'Israel', 'Sara', 'Sarah', 'Max', 'Moritz', 'Käthe', 'Siegfried', 'Bernhard', 'Ruth']
+GOLDEN_CORPUS_SURNAMES = ['Cohn', 'Kohn', 'Coen', 'Cohnova', 'Glaessner', 'Glässner', 'Loewy', 'Löwy', 'Levi', 'Abrahamsohn', 'Abrahams', 'Ansbacher', 'Straßmann', 'Rosenthal', 'Rosenthalova', 'Mayer', 'Meier', 'Kowalski', 'Kowalska', 'Goldschmidt']
+GOLDEN_CORPUS_PLACES = ['Berlin', 'Stadt Berlin', 'München', 'Muenchen', 'Wien', 'Dachau', 'Auschwitz', 'Theresienstadt', 'Deutsches Reich', 'Cottbus', 'Frankfurt am Main', 'Praha', 'Prag']
+
+
+def get_edge_case_pairs():
+    '''
+        Returns record pairs targeting the special cases of the scoring functions.
+    '''
+    base = {'forenames': ['Hans'], 'surnames': ['Cohn'], 'birth_place': ['Berlin'], 'birth_date': ['1921-12-01'], 'death_place': ['Auschwitz'], 'death_date': ['1943-03-12']}
+    cases = []
+
+    def add(name, local_changes, external_changes, values_to_be_disregarded={}):
+        cases.append({'name': name, 'local': {**base, **local_changes}, 'external': {**base, **external_changes}, 'values_to_be_disregarded': values_to_be_disregarded})
+
+    # unknown date parts
+    for date in ['1921-**-**', '1921-12-**', '1912-**-**', '**21-12-01', '1921-**-01']:
+        add(f'unknown date parts {date}', {}, {'birth_date': [date]})
+        add(f'unknown date parts on both sides {date}', {'birth_date': [date]}, {'birth_date': [date]})
+    # date thresholds
+    for date in ['<1945-05-08', '>1942-01-01', '<1943-03-12', '>1943-03-12', '<1943-03-**', '>1943-**-**', '<1940-01-01', '>1950-01-01']:
+        add(f'death date threshold {date}', {'death_date': [date]}, {})
+        add(f'death date threshold on both sides {date}', {'death_date': [date]}, {'death_date': [date]})
+    add('death date threshold range', {'death_date': ['>1942-01-01', '<1945-05-08']}, {})
+    add('death date threshold range with date', {'death_date': ['>1942-01-01', '<1945-05-08', '1943-03-12']}, {'death_date': ['1943-03-13']})
+    # ocr mistakes of 1 read as 7
+    for date in ['1927-12-07', '1921-72-01', '1921-12-07', '1971-12-01', '1927-72-07', '7921-12-01']:
+        add(f'ocr 7 for 1 {date}', {}, {'birth_date': [date]})
+    # swapped day and month, swapped year digits, invalid and malformed dates
+    for date in ['1921-01-12', '1912-12-01', '1921-02-30', '1921-13-01', '1921-12', '21-12-01', '', 'unknown', '01921-12-01']:
+        add(f'malformed or swapped date {date!r}', {}, {'birth_date': [date]})
+    add('several dates', {'birth_date': ['1921-12-01', '1922-01-12']}, {'birth_date': ['1922-01-21', '1921-**-**']})
+    # acronyms and initials
+    for forenames in [['H'], ['H.'], ['H', 'Hans'], ['H.', 'M.', 'Hans'], ['Hans M.'], ['Hans-Max'], ['Hans (Max)'], ['Hans; Max'], ['Hans/ Max']]:
+        add(f'acronyms {forenames}', {}, {'forenames': forenames})
+    add('acronyms only on both sides', {'forenames': ['H.']}, {'forenames': ['H']})
+    # potential shortforms and similar names
+    for forenames in [['Hannes'], ['Johannes'], ['Hansi'], ['Jean'], ['Hanna']]:
+        add(f'forename shortform {forenames}', {'forenames': ['Johannes']}, {'forenames': forenames})
+    for surnames in [['Kohn'], ['Cohnova'], ['Cohnowa'], ['Cohen'], ['Cohn', 'Loewy'], ['Löwy', 'Cohn'], ['C'], ['Cohnsohn']]:
+        add(f'surname variants {surnames}', {}, {'surnames': surnames})
+    # disregard values
+    for values_to_be_disregarded in [TTP_MATCHING_DEFAULT_DISREGARD_VALUES, {'forenames': ['Hans']}, {'surnames': ['Cohn']}, {'birth_place': ['Berlin']}, {'death_place': ['Auschwitz']}]:
+        add(f'disregard {values_to_be_disregarded}', {'forenames': ['Hans', 'Israel'], 'birth_place': ['Berlin', 'Deutsches Reich']}, {'forenames': ['Hans', 'Sara']}, values_to_be_disregarded)
+    add('only disregarded forenames', {'forenames': ['Israel']}, {'forenames': ['Israel']}, TTP_MATCHING_DEFAULT_DISREGARD_VALUES)
+    # missing and empty fields
+    for field in base:
+        add(f'missing local {field}', {field: []}, {})
+        add(f'missing external {field}', {}, {field: []})
+    add('empty records', {field: [] for field in base}, {field: [] for field in base})
+    # transliteration
+    for surnames in [['Straßmann'], ['Strassmann'], ['Коган'], ['Cohń'], ['COHN']]:
+        add(f'transliteration {surnames}', {'surnames': ['Strassmann']}, {'surnames': surnames})
+    return cases
+
+
+def get_random_record(generator):
+    record = {
+        'forenames': generator.sample(GOLDEN_CORPUS_FORENAMES, generator.randint(0, 2)),
+        'surnames': generator.sample(GOLDEN_CORPUS_SURNAMES, generator.randint(1, 2)),
+    }
+    for field in ['birth_place', 'death_place']:
+        if generator.random() < 0.6:
+            record[field] = generator.sample(GOLDEN_CORPUS_PLACES, generator.randint(1, 2))
+    for field, years in [('birth_date', (1860, 1940)), ('death_date', (1938, 1946))]:
+        if generator.random() < 0.7:
+            year = str(generator.randint(*years))
+            month = generator.choice([f'{generator.randint(1, 12):02d}'] * 4 + ['**'])
+            day = '**' if month == '**' else generator.choice([f'{generator.randint(1, 28):02d}'] * 4 + ['**'])
+            prefix = generator.choice([''] * 8 + ['<', '>']) if field == 'death_date' else ''
+            record[field] = [f'{prefix}{year}-{month}-{day}']
+    return record
+
+
+def get_perturbed_record(record, generator):
+    '''
+        Returns a copy of record with some values replaced, dropped or altered the way transcriptions differ.
+    '''
+    perturbed = {field: list(values) for field, values in record.items()}
+    for field, vocabulary in [('forenames', GOLDEN_CORPUS_FORENAMES), ('surnames', GOLDEN_CORPUS_SURNAMES), ('birth_place', GOLDEN_CORPUS_PLACES), ('death_place', GOLDEN_CORPUS_PLACES)]:
+        if field in perturbed and generator.random() < 0.3:
+            perturbed[field] = [generator.choice(vocabulary)] + perturbed[field][1:]
+    for field in ['birth_date', 'death_date']:
+        if field in perturbed and generator.random() < 0.5:
+            date = perturbed[field][0]
+            perturbed[field] = [generator.choice([
+                date.replace('1', '7', 1),
+                date[:-2] + date[-2:][::-1],
+                date[:5] + date[8:10] + '-' + date[5:7] if len(date) == 10 else date,
+                date[:2] + date[3] + date[2] + date[4:],
+                date[:-2] + '**',
+            ])]
+    if generator.random() < 0.1:
+        del perturbed[generator.choice(list(perturbed))]
+    return perturbed
+
+
+def get_random_pairs(count, seed=0):
+    generator = random.Random(seed)
+    pairs = []
+    for i in range(count):
+        local = get_random_record(generator)
+        external = get_perturbed_record(local, generator) if generator.random() < 0.7 else get_random_record(generator)
+        values_to_be_disregarded = TTP_MATCHING_DEFAULT_DISREGARD_VALUES if generator.random() < 0.3 else {}
+        pairs.append({'name': f'random {seed}-{i}', 'local': local, 'external': external, 'values_to_be_disregarded': values_to_be_disregarded})
+    return pairs
+
+
+def get_golden_corpus(random_pairs=1000, seed=0):
+    '''
+        Returns the notebook examples, the generated edge cases and random_pairs random pairs.
+    '''
+    return GOLDEN_CORPUS_NOTEBOOK_PAIRS + get_edge_case_pairs() + get_random_pairs(random_pairs, seed)
+
+
+def save_golden_corpus(path, corpus=None):
+    '''
+        Writes the corpus together with the results of the current implementation,
+        so that later versions can be compared against them with load_golden_corpus.
+    '''
+    corpus = corpus if corpus != None else get_golden_corpus()
+    rows = [{**pair, 'result': get_matching_score(pair['local'], pair['external'], pair['values_to_be_disregarded'])} for pair in corpus]
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(rows, f, ensure_ascii=False, default=float)
+
+
+def load_golden_corpus(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def get_matching_score_cases(corpus=None):
+    corpus = corpus if corpus != None else get_golden_corpus()
+    return [(pair['name'], (pair['local'], pair['external'], pair['values_to_be_disregarded'])) for pair in corpus]
+
+
+def get_name_cases(corpus=None):
+    '''
+        Returns the forename and surname comparisons of the corpus as arguments of match_against_local_data.
+    '''
+    corpus = corpus if corpus != None else get_golden_corpus()
+    cases = []
+    for pair in corpus:
+        for field, is_surname, potential_shortform in [('forenames', False, True), ('surnames', True, False)]:
+            local_names = get_names_as_dict(pair['local'].get(field, []), is_surname)
+            external_names = get_names_as_dict(pair['external'].get(field, []), is_surname)
+            if len(local_names) == 0 or len(external_names) == 0:
+                continue
+            disregard = get_names_as_dict(pair['values_to_be_disregarded'].get(field, []), is_surname)
+            cases.append((f'{pair["name"]} {field}', (local_names, external_names, disregard, potential_shortform)))
+    return cases
+
+
+def get_date_cases(corpus=None):
+    '''
+        Returns the notebook date examples and the date comparisons of the corpus as arguments of match_date_against_local_date.
+    '''
+    corpus = corpus if corpus != None else get_golden_corpus()
+    cases = [(f'notebook date {date}', (['1921-12-01'], [date])) for date in GOLDEN_CORPUS_NOTEBOOK_DATES]
+    for pair in corpus:
+        for field in ['birth_date', 'death_date']:
+            if len(pair['local'].get(field, [])) > 0 and len(pair['external'].get(field, [])) > 0:
+                cases.append((f'{pair["name"]} {field}', (pair['local'][field], pair['external'][field])))
+    return cases
+
+
+def get_divergences(reference, candidate, tolerance=EQUIVALENCE_DEFAULT_TOLERANCE, path=''):
+    '''
+        Compares two results recursively and returns a list of (path, reference value, candidate value)
+        for every difference. Numbers may differ by tolerance, booleans and everything else must be equal.
+    '''
+    if isinstance(reference, dict) and isinstance(candidate, dict):
+        divergences = []
+        for key in list(reference) + [key for key in candidate if key not in reference]:
+            if key not in reference or key not in candidate:
+                divergences.append((f'{path}/{key}', reference.get(key, '<missing>'), candidate.get(key, '<missing>')))
+            else:
+                divergences += get_divergences(reference[key], candidate[key], tolerance, f'{path}/{key}')
+        return divergences
+    if isinstance(reference, (list, tuple)) and isinstance(candidate, (list, tuple)) and len(reference) == len(candidate):
+        divergences = []
+        for i, (reference_value, candidate_value) in enumerate(zip(reference, candidate)):
+            divergences += get_divergences(reference_value, candidate_value, tolerance, f'{path}/{i}')
+        return divergences
+    if isinstance(reference, numbers.Number) and isinstance(candidate, numbers.Number) and not isinstance(reference, bool) and not isinstance(candidate, bool):
+        if abs(reference - candidate) <= tolerance:
+            return []
+        return [(path, reference, candidate)]
+    if reference != candidate:
+        return [(path or '/', reference, candidate)]
+    return []
+
+
+def run_differential_test(engine, cases=None, reference=get_matching_score, tolerance=EQUIVALENCE_DEFAULT_TOLERANCE, keys=None, verbose=True):
+    '''
+        Runs reference and engine on every (name, args) case and compares their results.
+        keys restricts the comparison to these keys of the results, e.g. ['absolute_score', 'automatically_matched']
+        for engines that don't return the details of each field.
+
+        Returns a dict with the number of cases, the divergences as (name, path, reference value, engine value)
+        and the seconds and cases per second of both implementations.
+    '''
+    cases = cases if cases != None else get_matching_score_cases()
+    reference_results = []
+    start = time.perf_counter()
+    for name, args in cases:
+        reference_results.append(reference(*args))
+    reference_seconds = time.perf_counter() - start
+
+    engine_results = []
+    start = time.perf_counter()
+    for name, args in cases:
+        engine_results.append(engine(*args))
+    engine_seconds = time.perf_counter() - start
+
+    divergences = []
+    for (name, args), reference_result, engine_result in zip(cases, reference_results, engine_results):
+        if keys != None:
+            reference_result = {key: reference_result.get(key) for key in keys}
+            engine_result = {key: engine_result.get(key) for key in keys}
+        divergences += [(name, *divergence) for divergence in get_divergences(reference_result, engine_result, tolerance)]
+
+    report = {
+        'cases': len(cases),
+        'divergences': divergences,
+        'reference_seconds': reference_seconds,
+        'engine_seconds': engine_seconds,
+        'reference_cases_per_second': len(cases) / reference_seconds if reference_seconds > 0 else 0,
+        'engine_cases_per_second': len(cases) / engine_seconds if engine_seconds > 0 else 0,
+        'speedup': reference_seconds / engine_seconds if engine_seconds > 0 else 0,
+    }
+    if verbose:
+        print(f'{len(cases)} cases, {len(divergences)} divergences')
+        for name, path, reference_value, engine_value in divergences[:EQUIVALENCE_MAX_REPORTED_DIVERGENCES]:
+            print(f'  {name}: {path} reference {reference_value!r} engine {engine_value!r}')
+        if len(divergences) > EQUIVALENCE_MAX_REPORTED_DIVERGENCES:
+            print(f'  ... {len(divergences) - EQUIVALENCE_MAX_REPORTED_DIVERGENCES} more')
+        print(f'reference: {report["reference_seconds"]:.3f}s ({report["reference_cases_per_second"]:.0f} cases/s)')
+        print(f'engine:    {report["engine_seconds"]:.3f}s ({report["engine_cases_per_second"]:.0f} cases/s), speedup {report["speedup"]:.2f}x')
+    return report
+
+
+def run_name_differential_test(engine, cases=None, tolerance=EQUIVALENCE_DEFAULT_TOLERANCE, keys=None, verbose=True):
+    '''
+        Same as run_differential_test for replacements of match_against_local_data, on get_name_cases by default.
+    '''
+    return run_differential_test(engine, cases if cases != None else get_name_cases(), match_against_local_data, tolerance, keys, verbose)
+
+
+def run_date_differential_test(engine, cases=None, tolerance=EQUIVALENCE_DEFAULT_TOLERANCE, keys=None, verbose=True):
+    '''
+        Same as run_differential_test for replacements of match_date_against_local_date, on get_date_cases by default.
+    '''
+    return run_differential_test(engine, cases if cases != None else get_date_cases(), match_date_against_local_date, tolerance, keys, verbose)
+
+
+def run_differential_test_against_golden_corpus(engine, path, tolerance=EQUIVALENCE_DEFAULT_TOLERANCE, keys=None, verbose=True):
+    '''
+        Compares engine with the results stored by save_golden_corpus, e.g. by an earlier version of the package.
+        The reference timings only measure the lookup of the stored results.
+    '''
+    cases = [(row['name'], (row['local'], row['external'], row['values_to_be_disregarded'], row['result'])) for row in load_golden_corpus(path)]
+    return run_differential_test(
+        lambda local, external, values_to_be_disregarded, result: engine(local, external, values_to_be_disregarded),
+        cases,
+        lambda local, external, values_to_be_disregarded, result: result,
+        tolerance, keys, verbose,
+    )
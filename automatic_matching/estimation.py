@@ -0,0 +1,162 @@
+'''
+    Estimates the outcome of a database to database linkage from a stratified random sample of its candidate pairs.
+
+    estimate = estimate_linkage(local_records, external_records, sample_size=10000)
+
+    The candidate pairs are those of get_candidate_pairs: all pairs sharing at least one blocking key. Every
+    block is a stratum. A pair sharing m keys appears in m blocks and is weighted with 1 / m, so that the totals
+    count every pair once. Blocks too small to receive a sample of their own on proportional allocation are
+    combined into one stratum, sampled by picking a block proportional to its size and a pair within it.
+    Strata small enough are scored completely.
+
+    For every total (pairs, automatic matches, scoring seconds, pairs per score range) the estimate is the sum
+    of the stratum estimates N_k * mean_k, with a normal approximation confidence interval from the within
+    stratum variances.
+'''
+import math
+import random
+import time
+
+from .automatic_matching_functions import get_matching_score
+from .blocking import get_blocking_keys
+
+ESTIMATION_DEFAULT_SAMPLE_SIZE = 10000
+ESTIMATION_DEFAULT_CONFIDENCE_Z = 1.96 # 95 %
+ESTIMATION_SCORE_BIN_WIDTH = 10
+ESTIMATION_COMBINED_STRATUM = None
+
+
+def get_record_keys(records):
+    return {record_id: set(get_blocking_keys(records[record_id])) for record_id in records}
+
+
+def get_blocks_from_keys(record_keys):
+    blocks = {}
+    for record_id, keys in record_keys.items():
+        for key in keys:
+            if key not in blocks:
+                blocks[key] = []
+            blocks[key].append(record_id)
+    return blocks
+
+
+def get_strata(local_blocks, external_blocks, sample_size):
+    '''
+        Returns a dict of stratum -> (list of blocking keys, number of (block, pair) entries, number of samples).
+    '''
+    block_sizes = {key: len(local_blocks[key]) * len(external_blocks[key]) for key in local_blocks if key in external_blocks}
+    total_entries = sum(block_sizes.values())
+    strata = {}
+    combined_keys = []
+    for key, size in block_sizes.items():
+        allocation = round(sample_size * size / total_entries) if total_entries > 0 else 0
+        if allocation >= 1:
+            strata[key] = ([key], size, min(allocation, size))
+        else:
+            combined_keys.append(key)
+    if len(combined_keys) > 0:
+        combined_size = sum(block_sizes[key] for key in combined_keys)
+        allocation = max(round(sample_size * combined_size / total_entries), 2)
+        strata[ESTIMATION_COMBINED_STRATUM] = (combined_keys, combined_size, min(allocation, combined_size))
+    return strata
+
+
+def get_stratum_sample(keys, size, number_of_samples, local_blocks, external_blocks, generator):
+    '''
+        Returns a list of (blocking key, local_id, external_id) entries and whether the stratum was sampled completely.
+    '''
+    if number_of_samples >= size:
+        return [(key, local_id, external_id) for key in keys for local_id in local_blocks[key] for external_id in external_blocks[key]], True
+    # drawn with replacement, the variance of the mean is then s^2 / n
+    weights = [len(local_blocks[key]) * len(external_blocks[key]) for key in keys]
+    sample = []
+    for key in generator.choices(keys, weights, k=number_of_samples) if len(keys) > 1 else [keys[0]] * number_of_samples:
+        sample.append((key, generator.choice(local_blocks[key]), generator.choice(external_blocks[key])))
+    return sample, False
+
+
+def get_interval(estimate, variance, z=ESTIMATION_DEFAULT_CONFIDENCE_Z):
+    margin = z * math.sqrt(max(variance, 0))
+    return {'estimate': estimate, 'low': max(estimate - margin, 0), 'high': estimate + margin}
+
+
+def estimate_linkage(local_records, external_records, values_to_be_disregarded={}, sample_size=ESTIMATION_DEFAULT_SAMPLE_SIZE, seed=0, z=ESTIMATION_DEFAULT_CONFIDENCE_Z):
+    '''
+        Scores a stratified sample of about sample_size candidate pairs of two dicts of record_id -> record
+        and extrapolates to all candidate pairs. Returns a dict with
+            'sampled_pairs': number of pairs scored
+            'pairs', 'automatic_matches', 'scoring_seconds': dicts with 'estimate', 'low' and 'high'
+            'automatic_match_rate': estimated share of candidate pairs that are automatically matched
+            'score_distribution': dict of absolute score bin start -> estimated number of pairs (with intervals)
+            'strata': number of strata, 'completely_scored_strata': number of strata without sampling error
+    '''
+    generator = random.Random(seed)
+    local_keys = get_record_keys(local_records)
+    external_keys = get_record_keys(external_records)
+    local_blocks = get_blocks_from_keys(local_keys)
+    external_blocks = get_blocks_from_keys(external_keys)
+    strata = get_strata(local_blocks, external_blocks, sample_size)
+
+    totals = {}
+    variances = {}
+
+    def add(name, estimate, variance):
+        totals[name] = totals.get(name, 0) + estimate
+        variances[name] = variances.get(name, 0) + variance
+
+    sampled_pairs = 0
+    completely_scored_strata = 0
+    scores = {}
+    for stratum, (keys, size, number_of_samples) in strata.items():
+        sample, complete = get_stratum_sample(keys, size, number_of_samples, local_blocks, external_blocks, generator)
+        completely_scored_strata += complete
+        values = {'pairs': [], 'automatic_matches': [], 'scoring_seconds': []}
+        bins = []
+        for key, local_id, external_id in sample:
+            weight = 1 / len(local_keys[local_id] & external_keys[external_id])
+            if (local_id, external_id) not in scores:
+                start = time.perf_counter()
+                result = get_matching_score(local_records[local_id], external_records[external_id], values_to_be_disregarded)
+                scores[(local_id, external_id)] = (result['absolute_score'], result['automatically_matched'], time.perf_counter() - start)
+            absolute_score, automatically_matched, seconds = scores[(local_id, external_id)]
+            values['pairs'].append(weight)
+            values['automatic_matches'].append(weight * automatically_matched)
+            values['scoring_seconds'].append(weight * seconds)
+            bins.append((int(absolute_score // ESTIMATION_SCORE_BIN_WIDTH) * ESTIMATION_SCORE_BIN_WIDTH, weight))
+        sampled_pairs += len(sample)
+
+        for score_bin in {x for x, weight in bins}:
+            values[('score_distribution', score_bin)] = [weight if x == score_bin else 0 for x, weight in bins]
+        for name, stratum_values in values.items():
+            n = len(stratum_values)
+            if n == 0:
+                continue
+            mean = sum(stratum_values) / n
+            if complete:
+                # every entry was scored, the sum is exact
+                add(name, sum(stratum_values), 0)
+                continue
+            sample_variance = sum((x - mean) ** 2 for x in stratum_values) / (n - 1) if n > 1 else 0
+            add(name, size * mean, size ** 2 * sample_variance / n)
+
+    estimate = {
+        'sampled_pairs': sampled_pairs,
+        'distinct_sampled_pairs': len(scores),
+        'strata': len(strata),
+        'completely_scored_strata': completely_scored_strata,
+    }
+    for name in ['pairs', 'automatic_matches', 'scoring_seconds']:
+        estimate[name] = get_interval(totals.get(name, 0), variances.get(name, 0), z)
+    estimate['automatic_match_rate'] = estimate['automatic_matches']['estimate'] / estimate['pairs']['estimate'] if estimate['pairs']['estimate'] > 0 else 0
+    score_bins = sorted(name[1] for name in totals if type(name) == tuple)
+    estimate['score_distribution'] = {score_bin: get_interval(totals[('score_distribution', score_bin)], variances[('score_distribution', score_bin)], z) for score_bin in score_bins}
+    return estimate
+
+
+def print_linkage_estimate(estimate):
+    for name, unit in [('pairs', ''), ('automatic_matches', ''), ('scoring_seconds', 's')]:
+        interval = estimate[name]
+        print(f'{name}: {interval["estimate"]:.0f}{unit} ({interval["low"]:.0f}{unit} - {interval["high"]:.0f}{unit})')
+    print(f'automatic match rate: {100 * estimate["automatic_match_rate"]:.3f} %, from {estimate["sampled_pairs"]} sampled pairs in {estimate["strata"]} strata')
+    for score_bin, interval in estimate['score_distribution'].items():
+        print(f'  {score_bin:>4} - {score_bin + ESTIMATION_SCORE_BIN_WIDTH:<4} {interval["estimate"]:.0f}')
@@ -0,0 +1,173 @@
+'''
+    Progress, throughput and cache metrics for long running linkage jobs.
+
+    All batch and linkage entry points take an optional metrics argument, without it nothing is measured.
+
+    metrics = LinkageMetrics(total_pairs=len(candidate_pairs), report_interval=60)
+    metrics.register_cache('dates', date_table)
+    results = run_scoring_pipeline(candidate_pairs, local_records, external_records, metrics=metrics, date_table=date_table)
+    metrics.save('metrics.json')
+'''
+import json
+import logging
+import math
+import threading
+import time
+
+try:
+    import resource
+except ImportError: # not available on Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+LATENCY_HISTOGRAM_BUCKETS = 32 # powers of two in microseconds, the last bucket collects everything above
+
+
+def get_peak_memory():
+    '''
+        Returns the peak resident memory of the current process in bytes, or None if it can't be determined.
+    '''
+    if resource == None:
+        return None
+    # ru_maxrss is given in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class LatencyHistogram:
+
+    def __init__(self):
+        self.count = 0
+        self.total_seconds = 0
+        self.max_seconds = 0
+        self.buckets = [0] * LATENCY_HISTOGRAM_BUCKETS
+
+    def add(self, seconds):
+        '''
+            Adds a single item that took seconds.
+        '''
+        microseconds = seconds * 1e6
+        bucket = min(int(math.log2(microseconds)) + 1, LATENCY_HISTOGRAM_BUCKETS - 1) if microseconds >= 1 else 0
+        self.buckets[bucket] += 1
+        self.count += 1
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+
+    def get_snapshot(self):
+        return {
+            'count': self.count,
+            'total_seconds': self.total_seconds,
+            'mean_seconds': self.total_seconds / self.count if self.count > 0 else 0,
+            'max_seconds': self.max_seconds,
+            # bucket i counts latencies below 2^i microseconds
+            'buckets_microseconds': {f'<{2**i}': x for i, x in enumerate(self.buckets) if x > 0},
+        }
+
+
+class LinkageMetrics:
+    '''
+        Collects pairs scored and pruned, per stage latency histograms and cache hit rates.
+        Every report_interval seconds a snapshot is logged as JSON and passed to callback, if provided.
+        Can be shared between threads.
+    '''
+
+    def __init__(self, total_pairs=None, callback=None, report_interval=None):
+        self.total_pairs = total_pairs
+        self.callback = callback
+        self.report_interval = report_interval
+        self.start_time = time.perf_counter()
+        self.last_report_time = self.start_time
+        self.pairs_scored = 0
+        self.pairs_pruned = 0
+        self.stages = {}
+        self.caches = {}
+        self.lock = threading.Lock()
+
+    def register_cache(self, name, cache):
+        '''
+            Registers a cache providing get_statistics() with 'hits' and 'misses', e.g. a DateScoreTable.
+        '''
+        statistics = cache.get_statistics() if hasattr(cache, 'get_statistics') else None
+        if not isinstance(statistics, dict) or 'hits' not in statistics or 'misses' not in statistics:
+            raise ValueError(f'Cache {name} has to provide get_statistics() with hits and misses')
+        self.caches[name] = cache
+
+    def record_stage(self, stage, seconds):
+        '''
+            Records the latency of a single item.
+        '''
+        self.record_stage_latencies(stage, [seconds])
+
+    def record_stage_latencies(self, stage, latencies):
+        '''
+            Records the latencies of several items timed one by one, e.g. the pairs of a chunk scored in a worker.
+        '''
+        with self.lock:
+            if stage not in self.stages:
+                self.stages[stage] = LatencyHistogram()
+            for seconds in latencies:
+                self.stages[stage].add(seconds)
+
+    def add_scored(self, count=1):
+        with self.lock:
+            self.pairs_scored += count
+        self.report_if_due()
+
+    def add_pruned(self, count=1):
+        with self.lock:
+            self.pairs_pruned += count
+        self.report_if_due()
+
+    def report_if_due(self):
+        if self.report_interval == None:
+            return
+        now = time.perf_counter()
+        if now - self.last_report_time < self.report_interval:
+            return
+        self.last_report_time = now
+        self.report()
+
+    def report(self):
+        snapshot = self.get_snapshot()
+        logger.info(json.dumps(snapshot))
+        if self.callback != None:
+            self.callback(snapshot)
+
+    def get_snapshot(self):
+        elapsed = time.perf_counter() - self.start_time
+        pairs_done = self.pairs_scored + self.pairs_pruned
+        pairs_per_second = self.pairs_scored / elapsed if elapsed > 0 else 0
+        eta = None
+        if self.total_pairs != None and pairs_done > 0:
+            eta = max(self.total_pairs - pairs_done, 0) * elapsed / pairs_done
+
+        caches = {}
+        for name, cache in self.caches.items():
+            statistics = cache.get_statistics()
+            lookups = statistics['hits'] + statistics['misses']
+            caches[name] = {
+                **statistics,
+                'hit_rate': statistics['hits'] / lookups if lookups > 0 else 0,
+            }
+
+        with self.lock:
+            stages = {stage: histogram.get_snapshot() for stage, histogram in self.stages.items()}
+
+        return {
+            'elapsed_seconds': elapsed,
+            'pairs_scored': self.pairs_scored,
+            'pairs_pruned': self.pairs_pruned,
+            'total_pairs': self.total_pairs,
+            'pairs_per_second': pairs_per_second,
+            'eta_seconds': eta,
+            'stages': stages,
+            'caches': caches,
+            'peak_memory_bytes': get_peak_memory(),
+        }
+
+    def to_json(self):
+        return json.dumps(self.get_snapshot())
+
+    def save(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.to_json())
@@ -0,0 +1,137 @@
+import time
+import zlib
+
+import numpy as np
+
+from .automatic_matching_functions import get_matching_score, normalize_string, split_string_values
+from .blocking import get_candidate_pairs
+
+MINHASH_QGRAM_PADDING = '#'
+
+
+def get_name_qgrams(record, q=2):
+    '''
+        Returns the set of character q-grams of the normalized forenames and surnames of a record.
+        Every name is padded, so that short names and name boundaries produce q-grams as well.
+    '''
+    qgrams = set()
+    for field, is_surname in [('forenames', False), ('surnames', True)]:
+        for value in record.get(field, []):
+            for name in split_string_values(value):
+                padded = MINHASH_QGRAM_PADDING + normalize_string(name, is_surname) + MINHASH_QGRAM_PADDING
+                for i in range(max(len(padded) - q + 1, 1)):
+                    qgrams.add(padded[i:i + q])
+    return qgrams
+
+
+class MinHashLSHIndex:
+    '''
+        Approximate nearest neighbour index over the name q-grams of a database.
+
+        Every record gets a MinHash signature of bands * rows values, records that agree on all rows of
+        at least one band become candidates. Two records with a q-gram Jaccard similarity s collide with a
+        probability of 1 - (1 - s^rows)^bands, more bands increase recall, more rows decrease the number of candidates.
+        Unlike phonetic blocking this still finds names whose metaphone codes diverge completely,
+        e.g. transliterated or OCR garbled names.
+    '''
+
+    def __init__(self, bands=16, rows=4, q=2, seed=0):
+        self.bands = bands
+        self.rows = rows
+        self.q = q
+        random_generator = np.random.default_rng(seed)
+        # multiply shift hashing: h(x) = ((a * x + b) mod 2^64) >> 32 with odd a
+        self.hash_a = random_generator.integers(0, 2**63, bands * rows, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self.hash_b = random_generator.integers(0, 2**63, bands * rows, dtype=np.uint64)
+        self.buckets = [{} for _ in range(bands)]
+        self.number_of_records = 0
+
+    def get_signature(self, record):
+        qgrams = get_name_qgrams(record, self.q)
+        if len(qgrams) == 0:
+            return None
+        qgram_hashes = np.array([zlib.crc32(qgram.encode('utf-8')) for qgram in qgrams], dtype=np.uint64)
+        hashes = (self.hash_a[:, None] * qgram_hashes[None, :] + self.hash_b[:, None]) >> np.uint64(32)
+        return hashes.min(axis=1)
+
+    def get_band_keys(self, signature):
+        return [signature[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
+
+    def add(self, record_id, record):
+        signature = self.get_signature(record)
+        if signature is None:
+            return
+        for band, key in enumerate(self.get_band_keys(signature)):
+            if key not in self.buckets[band]:
+                self.buckets[band][key] = []
+            self.buckets[band][key].append(record_id)
+        self.number_of_records += 1
+
+    @classmethod
+    def from_records(cls, records, bands=16, rows=4, q=2, seed=0):
+        '''
+            Builds the index over a dict of record_id -> record, usually the external database.
+        '''
+        index = cls(bands, rows, q, seed)
+        for record_id in records:
+            index.add(record_id, records[record_id])
+        return index
+
+    def query(self, record):
+        '''
+            Returns the set of ids of all indexed records sharing at least one band with the given record.
+        '''
+        signature = self.get_signature(record)
+        candidates = set()
+        if signature is None:
+            return candidates
+        for band, key in enumerate(self.get_band_keys(signature)):
+            candidates.update(self.buckets[band].get(key, []))
+        return candidates
+
+    def get_candidate_pairs(self, local_records):
+        '''
+            Yields all (local_id, external_id) candidate pairs for a dict of record_id -> record.
+        '''
+        for local_id in local_records:
+            for external_id in self.query(local_records[local_id]):
+                yield local_id, external_id
+
+
+def benchmark_minhash_lsh(local_records, external_records, bands=16, rows=4, q=2, values_to_be_disregarded={}):
+    '''
+        Compares the recall and cost of the MinHash LSH candidates with phonetic blocking.
+        The reference are all automatically matched pairs of the full cartesian product,
+        so this should be run on a sample of the databases.
+    '''
+    start = time.perf_counter()
+    automatically_matched_pairs = set()
+    for local_id in local_records:
+        for external_id in external_records:
+            if get_matching_score(local_records[local_id], external_records[external_id], values_to_be_disregarded)['automatically_matched']:
+                automatically_matched_pairs.add((local_id, external_id))
+    cartesian_time = time.perf_counter() - start
+    number_of_pairs = len(local_records) * len(external_records)
+
+    start = time.perf_counter()
+    index = MinHashLSHIndex.from_records(external_records, bands, rows, q)
+    build_time = time.perf_counter() - start
+    start = time.perf_counter()
+    lsh_candidates = set(index.get_candidate_pairs(local_records))
+    query_time = time.perf_counter() - start
+    blocking_candidates = set(get_candidate_pairs(local_records, external_records))
+
+    result = {
+        'number_of_pairs': number_of_pairs,
+        'automatically_matched_pairs': len(automatically_matched_pairs),
+        'cartesian_time': cartesian_time,
+        'lsh_build_time': build_time,
+        'lsh_query_time': query_time,
+    }
+    for label, candidates in [('lsh', lsh_candidates), ('blocking', blocking_candidates)]:
+        result[f'{label}_candidates'] = len(candidates)
+        result[f'{label}_candidate_ratio'] = len(candidates) / number_of_pairs if number_of_pairs > 0 else 0
+        result[f'{label}_recall'] = len(candidates & automatically_matched_pairs) / len(automatically_matched_pairs) if len(automatically_matched_pairs) > 0 else 1
+        print(f"{label}: {result[f'{label}_candidates']} candidates ({100 * result[f'{label}_candidate_ratio']:.2f} % of {number_of_pairs} pairs), recall {100 * result[f'{label}_recall']:.2f} % of {len(automatically_matched_pairs)} automatic matches")
+    print(f'LSH build {build_time:.3f}s, query {query_time:.3f}s, cartesian scoring {cartesian_time:.3f}s')
+    return result
@@ -0,0 +1,141 @@
+import json
+import math
+
+import numpy as np
+
+from .automatic_matching_functions import get_doublemetaphone_matching_score, get_names_as_dict
+from .bk_tree import BKTree
+from .shortform_index import ShortformIndex
+
+NAME_GRAPH_FIELDS = [('forenames', False), ('surnames', True)]
+
+NAME_GRAPH_DEFAULT_THRESHOLD = 0.25
+NAME_GRAPH_MISSING_SCORE = 1 # pairs missing from the graph are treated as "far"
+
+
+def get_name_graph_vocabulary(databases):
+    '''
+        Collects the original and normalized forenames and surnames of several dicts of record_id -> record.
+        Returns one sorted list of tokens per field. match_against_local_data compares original names with the
+        normalized names of the other data set, so both kinds of tokens are kept in the same group.
+    '''
+    groups = {}
+    for records in databases:
+        for record in records.values():
+            for field, is_surname in NAME_GRAPH_FIELDS:
+                names = get_names_as_dict(record.get(field, []), is_surname)
+                group = groups.setdefault(field, set())
+                group.update(names)
+                for normalized in names:
+                    group.update(names[normalized])
+    return [sorted(groups[key]) for key in sorted(groups)]
+
+
+def get_name_graph_candidates(tokens, threshold):
+    '''
+        Yields all pairs of tokens that can have a get_doublemetaphone_matching_score below threshold.
+
+        The score is below t only if the metaphone similarity exceeds 1 - t. Without the shortform rule this
+        requires the similarity of the primary codes to exceed 1 - 4t, i.e. a Levenshtein distance of the primary
+        codes below 4t times the shorter code's length, which is searched with a BK-tree over the codes.
+        The shortform rule additionally requires one primary code to contain the other.
+        For thresholds above 0.25 there is no such bound and all pairs are returned.
+    '''
+    if threshold > 0.25:
+        for i in range(len(tokens)):
+            for j in range(i + 1, len(tokens)):
+                yield tokens[i], tokens[j]
+        return
+
+    shortform_index = ShortformIndex(tokens)
+    tokens_by_primary_code = {}
+    for token in tokens:
+        tokens_by_primary_code.setdefault(shortform_index.get_codes(token)[0], []).append(token)
+    code_tree = BKTree(tokens_by_primary_code)
+
+    token_ids = {token: i for i, token in enumerate(tokens)}
+    for token in tokens:
+        code = shortform_index.get_codes(token)[0]
+        candidates = set()
+        max_distance = math.ceil(4 * threshold * max(len(code), 1)) - 1
+        for similar_code, distance in code_tree.search(code, max_distance):
+            candidates.update(tokens_by_primary_code[similar_code])
+        # potential shortforms: codes containing this code or contained in it
+        candidates.update(shortform_index.get_names_containing_code(code))
+        for start in range(len(code)):
+            for end in range(start + 1, len(code) + 1):
+                candidates.update(tokens_by_primary_code.get(code[start:end], []))
+        for candidate in candidates:
+            if token_ids[candidate] > token_ids[token]:
+                yield token, candidate
+
+
+class NameSimilarityGraph:
+    '''
+        Sparse graph of get_doublemetaphone_matching_score values between all name tokens of a linkage run.
+
+        Tokens are interned to ids, every edge stores the scores without and with potential_shortform.
+        Only pairs scoring below the threshold for at least one of both settings are kept, every other pair
+        is answered with NAME_GRAPH_MISSING_SCORE. Identical tokens always score 0.
+        Scores of get_matching_score with the graph therefore differ from those without it, except for
+        thresholds above 1, which keep every pair.
+    '''
+
+    def __init__(self, tokens, keys, scores, threshold):
+        self.tokens = tokens
+        self.token_ids = {token: i for i, token in enumerate(tokens)}
+        self.keys = keys
+        self.scores = scores
+        self.threshold = threshold
+        self.edges = {int(key): i for i, key in enumerate(keys)}
+
+    @classmethod
+    def build(cls, databases, threshold=NAME_GRAPH_DEFAULT_THRESHOLD):
+        '''
+            Builds the graph over the name tokens of several dicts of record_id -> record, e.g. [local_records, external_records].
+        '''
+        groups = get_name_graph_vocabulary(databases)
+        tokens = sorted(set(token for group in groups for token in group))
+        token_ids = {token: i for i, token in enumerate(tokens)}
+        edges = {}
+        for group in groups:
+            for token_1, token_2 in get_name_graph_candidates(group, threshold):
+                id_1, id_2 = sorted([token_ids[token_1], token_ids[token_2]])
+                key = (id_1 << 32) | id_2
+                if key in edges:
+                    continue
+                scores = (
+                    get_doublemetaphone_matching_score(tokens[id_1], tokens[id_2], False),
+                    get_doublemetaphone_matching_score(tokens[id_1], tokens[id_2], True),
+                )
+                if min(scores) < threshold:
+                    edges[key] = scores
+
+        keys = np.array(sorted(edges), dtype=np.uint64)
+        scores = np.array([edges[int(key)] for key in keys], dtype=np.float64).reshape(-1, 2)
+        return cls(tokens, keys, scores, threshold)
+
+    def get_score(self, val_1, val_2, potential_shortform=False):
+        if val_1 == val_2:
+            return 0.0
+        id_1 = self.token_ids.get(val_1, None)
+        id_2 = self.token_ids.get(val_2, None)
+        if id_1 == None or id_2 == None:
+            return NAME_GRAPH_MISSING_SCORE
+        if id_1 > id_2:
+            id_1, id_2 = id_2, id_1
+        edge = self.edges.get((id_1 << 32) | id_2, None)
+        if edge == None:
+            return NAME_GRAPH_MISSING_SCORE
+        return float(self.scores[edge, 1 if potential_shortform else 0])
+
+    def __len__(self):
+        return len(self.keys)
+
+    def save(self, path):
+        np.savez_compressed(path, tokens=np.array(json.dumps(self.tokens, ensure_ascii=False)), keys=self.keys, scores=self.scores, threshold=self.threshold)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        return cls(json.loads(str(data['tokens'])), data['keys'], data['scores'], float(data['threshold']))
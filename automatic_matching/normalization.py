@@ -0,0 +1,126 @@
+'''
+    Faster drop-in for normalize_string with byte-identical output.
+
+    normalizer = NameNormalizer()
+    result = get_matching_score(local_data_set, external_data_set, normalizer=normalizer)
+    scores = score_column_pairs(local_table, external_table, local_indices, external_indices, normalizer=normalizer)
+
+    normalize_string applies its rules as a sequence of re.sub and str.replace passes. Most of them can't be
+    merged into a single pass without changing results, e.g. 'aeue' becomes 'aue' because the 'ue' rule sees
+    the output of the 'ae' rule. NameNormalizer therefore keeps the order of the rules but
+      - replaces the anchored surname rules by a chain of endswith checks (removing 'owa' can create 'sohn'),
+      - merges the independent single character replacements j, y -> i and w -> v into one str.translate,
+      - drops the rule (?=h|q|s|z)c -> k, which can never match (a position can't hold both 'c' and h, q, s or z),
+      - uses precompiled patterns for the remaining regular expressions,
+      - memoizes the result per (value, is_surname), names repeat a lot across records.
+'''
+import re
+import threading
+import time
+
+from .automatic_matching_functions import get_latin_transliterator, normalize_string
+
+NAME_NORMALIZER_DEFAULT_MAX_SIZE = 1000000
+
+SINGLE_CHARACTER_REPLACEMENTS = str.maketrans({'j': 'i', 'y': 'i', 'w': 'v'})
+UE_PATTERN = re.compile(r'(?<!a)ue')
+DOUBLE_CHARACTER_PATTERN = re.compile(r'([a-zA-Z])\1')
+
+
+def normalize_transliterated_string(value, is_surname=False):
+    '''
+        Applies the replacement rules of normalize_string to an already transliterated value.
+    '''
+    if is_surname:
+        if value.endswith(('owa', 'ova')):
+            value = value[:-3]
+        if value.endswith('sohns'):
+            value = value[:-5] + 'sons'
+        elif value.endswith('sohn'):
+            value = value[:-4] + 'son'
+        if value.endswith(('ska', 'cka')):
+            value = value[:-1] + 'i'
+
+    value = value.replace('ae', 'a').replace('oe', 'o')
+    if 'ue' in value:
+        value = UE_PATTERN.sub('u', value)
+    value = value.replace('th', 't').replace('ck', 'k').replace('ph', 'f')
+    value = value.translate(SINGLE_CHARACTER_REPLACEMENTS)
+    if not is_surname:
+        value = value.replace('tz', 'z')
+    return DOUBLE_CHARACTER_PATTERN.sub(r'\1', value)
+
+
+class NameNormalizer:
+    '''
+        Memoizing normalize_string. Once max_size values are stored, further values are normalized but no longer stored.
+        Can be shared between threads.
+    '''
+
+    def __init__(self, max_size=NAME_NORMALIZER_DEFAULT_MAX_SIZE):
+        self.max_size = max_size
+        self.values = {}
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def normalize(self, value, is_surname=False):
+        '''
+            Same result as normalize_string(value, is_surname).
+        '''
+        key = (value, is_surname)
+        with self.lock:
+            result = self.values.get(key, None)
+            if result != None:
+                self.hits += 1
+                return result
+        if '\n' in value:
+            # $ in the reference patterns also matches before a trailing newline, which the endswith chain doesn't cover
+            result = normalize_string(value, is_surname)
+        else:
+            result = normalize_transliterated_string(get_latin_transliterator().transliterate(value), is_surname)
+        with self.lock:
+            self.misses += 1
+            if len(self.values) < self.max_size:
+                self.values[key] = result
+        return result
+
+    def get_statistics(self):
+        return {
+            'stored_values': len(self.values),
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+
+def benchmark_name_normalization(values, repeat=3):
+    '''
+        Compares normalize_string with a NameNormalizer, without memoization (first pass over the values)
+        and with memoization (further passes), and makes sure both return the same results.
+    '''
+    values = list(values)
+    timings = {}
+    for is_surname in [False, True]:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            reference = [normalize_string(value, is_surname) for value in values]
+        timings[('reference', is_surname)] = (time.perf_counter() - start) / repeat
+
+        start = time.perf_counter()
+        uncached = [normalize_transliterated_string(get_latin_transliterator().transliterate(value), is_surname) if '\n' not in value else normalize_string(value, is_surname) for value in values]
+        timings[('compiled', is_surname)] = time.perf_counter() - start
+
+        normalizer = NameNormalizer()
+        start = time.perf_counter()
+        for _ in range(repeat):
+            cached = [normalizer.normalize(value, is_surname) for value in values]
+        timings[('memoized', is_surname)] = (time.perf_counter() - start) / repeat
+
+        mismatches = [value for value, x, y, z in zip(values, reference, uncached, cached) if not x == y == z]
+        if len(mismatches) > 0:
+            raise AssertionError(f'Normalization differs for {len(mismatches)} values, e.g. {mismatches[:5]}')
+        label = 'surnames' if is_surname else 'forenames'
+        for engine in ['reference', 'compiled', 'memoized']:
+            seconds = timings[(engine, is_surname)]
+            print(f'{label} {engine}: {seconds * 1e6 / max(len(values), 1):.2f}µs per token ({timings[("reference", is_surname)] / seconds if seconds > 0 else 0:.2f}x)')
+    return timings
@@ -0,0 +1,89 @@
+'''
+    Caches the results of get_matching_score by record content, so that duplicate records exported by
+    several sources are compared only once.
+
+    pair_cache = PairResultCache()
+    scored_pairs = score_candidate_pairs(candidate_pairs, local_records, external_records, pair_cache=pair_cache)
+
+    A record fingerprint covers the fields get_matching_score reads, with the values of every field sorted,
+    so records differing only in their id, further fields or the order of their values share a fingerprint.
+    The scores of such records are equal within float rounding only: the name scores average over the values
+    in the order of the record, so a cached score can differ from a fresh one in the last digits (about 1e-14).
+    The listings of the compared values in the result follow the record that was scored first.
+'''
+import copy
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from .automatic_matching_functions import get_matching_score, NAME_FIELDS, DATE_FIELDS
+
+PAIR_RESULT_CACHE_DEFAULT_MAX_SIZE = 100000
+
+
+def get_record_fingerprint(record):
+    '''
+        Returns a hex digest of the canonical content of a record or of a dict of values to be disregarded.
+    '''
+    content = {field: sorted(record[field]) for field in list(NAME_FIELDS) + DATE_FIELDS if field in record}
+    return hashlib.blake2b(json.dumps(content, sort_keys=True, ensure_ascii=False).encode('utf-8'), digest_size=16).hexdigest()
+
+
+class PairResultCache:
+    '''
+        Least recently used cache of get_matching_score results keyed by the fingerprints of both records
+        and the values to be disregarded, holding at most max_size results.
+        Results are copied on the way in and out, callers may modify them. Can be shared between threads.
+    '''
+
+    def __init__(self, max_size=PAIR_RESULT_CACHE_DEFAULT_MAX_SIZE):
+        self.max_size = max_size
+        self.results = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            result = self.results.get(key, None)
+            if result == None:
+                self.misses += 1
+                return None
+            self.results.move_to_end(key)
+            self.hits += 1
+        return copy.deepcopy(result)
+
+    def put(self, key, result):
+        result = copy.deepcopy(result)
+        with self.lock:
+            self.results[key] = result
+            self.results.move_to_end(key)
+            while len(self.results) > self.max_size:
+                self.results.popitem(last=False)
+                self.evictions += 1
+
+    def get_matching_score(self, local_data_set, external_data_set, values_to_be_disregarded={}, local_fingerprint=None, external_fingerprint=None, disregard_fingerprint=None):
+        '''
+            Same as get_matching_score, returning the stored result for pairs with the same content.
+            Fingerprints computed by the caller (e.g. once per record of a batch) can be passed in.
+        '''
+        key = (
+            local_fingerprint or get_record_fingerprint(local_data_set),
+            external_fingerprint or get_record_fingerprint(external_data_set),
+            disregard_fingerprint or get_record_fingerprint(values_to_be_disregarded),
+        )
+        result = self.get(key)
+        if result == None:
+            result = get_matching_score(local_data_set, external_data_set, values_to_be_disregarded)
+            self.put(key, result)
+        return result
+
+    def get_statistics(self):
+        return {
+            'stored_results': len(self.results),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
@@ -0,0 +1,180 @@
+'''
+    Cascaded scoring: candidates are passed through increasingly expensive stages, each of them computing
+    an upper bound of the absolute_score get_matching_score could return. A candidate is only rejected if
+    this bound proves that it can't be automatically matched, i.e. it can neither reach
+    MIN_REQUIRED_SCORE_FOR_AUTO_MATCHING nor MIN_TOTAL_SCORE_FOR_MATCH_WITH_PERFECT_RELATIVE_SCORE with a
+    perfect total relative score.
+
+    'bounds': exact date scores (birth year distance, date range disjointness, ...), maximum contribution for all other fields
+    'names':  exact forename and surname scores, maximum contribution for the places
+    'full':   get_matching_score
+'''
+import time
+
+from .automatic_matching_functions import (
+    get_names_as_dict, match_against_local_data, match_date_against_local_date, get_matching_score,
+    FORENAME_MAX_SCORE_CONTRIBUTION, SURNAME_MAX_SCORE_CONTRIBUTION,
+    BIRTH_PLACE_MAX_SCORE_CONTRIBUTION, BIRTH_DATE_MAX_SCORE_CONTRIBUTION,
+    DEATH_PLACE_MAX_SCORE_CONTRIBUTION, DEATH_DATE_MAX_SCORE_CONTRIBUTION,
+    MIN_REQUIRED_SCORE_FOR_AUTO_MATCHING, MIN_TOTAL_SCORE_FOR_MATCH_WITH_PERFECT_RELATIVE_SCORE,
+)
+
+PIPELINE_STAGES = ['bounds', 'names', 'full']
+
+# absolute scores are sums of floats, bounds summed in a different order may differ in the last digits
+PIPELINE_SCORE_TOLERANCE = 1e-9
+
+PIPELINE_NAME_FIELDS = [
+    # field, is_surname, potential_shortform, max contribution
+    ('forenames', False, True, FORENAME_MAX_SCORE_CONTRIBUTION),
+    ('surnames', True, False, SURNAME_MAX_SCORE_CONTRIBUTION),
+]
+PIPELINE_PLACE_FIELDS = [
+    ('birth_place', BIRTH_PLACE_MAX_SCORE_CONTRIBUTION),
+    ('death_place', DEATH_PLACE_MAX_SCORE_CONTRIBUTION),
+]
+PIPELINE_DATE_FIELDS = [
+    ('birth_date', BIRTH_DATE_MAX_SCORE_CONTRIBUTION),
+    ('death_date', DEATH_DATE_MAX_SCORE_CONTRIBUTION),
+]
+
+
+def could_reach_auto_matching(upper_bound, perfect_score_possible, min_score=None):
+    '''
+        Returns False only if a pair with the given upper bound of its absolute_score can't be automatically matched
+        (and can't reach min_score, if provided).
+    '''
+    if upper_bound >= MIN_REQUIRED_SCORE_FOR_AUTO_MATCHING - PIPELINE_SCORE_TOLERANCE:
+        return True
+    if perfect_score_possible and upper_bound >= MIN_TOTAL_SCORE_FOR_MATCH_WITH_PERFECT_RELATIVE_SCORE - PIPELINE_SCORE_TOLERANCE:
+        return True
+    return min_score != None and upper_bound >= min_score - PIPELINE_SCORE_TOLERANCE
+
+
+def get_values(data_set, field):
+    return data_set.get(field, [])
+
+
+def get_date_bounds(local_data_set, external_data_set, date_table=None):
+    '''
+        Returns the exact contribution of the date fields and whether a perfect total relative score is still possible.
+    '''
+    score = 0
+    perfect_score_possible = True
+    for field, max_contribution in PIPELINE_DATE_FIELDS:
+        local_dates = get_values(local_data_set, field)
+        external_dates = get_values(external_data_set, field)
+        if len(local_dates) > 0 and len(external_dates) > 0:
+            if date_table != None:
+                date_score = date_table.match(local_dates, external_dates)['score']
+            else:
+                date_score = match_date_against_local_date(local_dates, external_dates)['score']
+            score += date_score * max_contribution
+            perfect_score_possible = perfect_score_possible and date_score == 1
+        elif len(local_dates) > 0 or len(external_dates) > 0:
+            # counts towards the maximal total score without contributing to the absolute score
+            perfect_score_possible = False
+    return score, perfect_score_possible
+
+
+def get_maximum_contribution(local_data_set, external_data_set, fields):
+    return sum(max_contribution for field, *rest, max_contribution in fields if len(get_values(local_data_set, field)) > 0 and len(get_values(external_data_set, field)) > 0)
+
+
+def get_name_scores(local_data_set, external_data_set, disregard_names, shortform_index=None, name_graph=None):
+    '''
+        Returns the exact contribution of forenames and surnames and whether a perfect total relative score is still possible.
+    '''
+    score = 0
+    perfect_score_possible = True
+    for field, is_surname, potential_shortform, max_contribution in PIPELINE_NAME_FIELDS:
+        local_names = get_names_as_dict(get_values(local_data_set, field), is_surname)
+        external_names = get_names_as_dict(get_values(external_data_set, field), is_surname)
+        if len(local_names) > 0 and len(external_names) > 0:
+            name_score = match_against_local_data(local_names, external_names, disregard_names[field], potential_shortform, shortform_index if potential_shortform else None, name_graph)['score']
+            score += name_score * max_contribution
+            perfect_score_possible = perfect_score_possible and name_score == 1
+        elif len(local_names) > 0 or len(external_names) > 0:
+            perfect_score_possible = False
+    return score, perfect_score_possible
+
+
+def run_scoring_pipeline(candidate_pairs, local_records, external_records, values_to_be_disregarded={}, stages=PIPELINE_STAGES, min_score=None, shortform_index=None, name_graph=None, date_table=None, metrics=None):
+    '''
+        Scores (local_id, external_id) pairs against two dicts of record_id -> record, skipping every pair
+        the enabled stages prove can't be automatically matched (or can't reach min_score, if provided).
+        The 'full' stage is always run last.
+
+        Returns a dict with
+            'results': list of (local_id, external_id, result) as returned by get_matching_score for all surviving pairs
+            'stages': list of dicts with the name, number of candidates, number of rejected candidates and seconds per stage
+        The stage statistics are also recorded in metrics, if provided.
+    '''
+    for stage in stages:
+        if stage not in PIPELINE_STAGES:
+            raise ValueError(f'Unknown pipeline stage: {stage}')
+
+    disregard_names = {field: get_names_as_dict(values_to_be_disregarded.get(field, []), is_surname) for field, is_surname, *rest in PIPELINE_NAME_FIELDS}
+    candidates = [{'local_id': local_id, 'external_id': external_id} for local_id, external_id in candidate_pairs]
+    statistics = []
+    if metrics != None and date_table != None and 'dates' not in metrics.caches:
+        metrics.register_cache('dates', date_table)
+
+    def add_statistics(stage, number_of_candidates, rejected, seconds, latencies):
+        statistics.append({'stage': stage, 'candidates': number_of_candidates, 'rejected': rejected, 'seconds': seconds})
+        if metrics != None and number_of_candidates > 0:
+            metrics.record_stage_latencies(stage, latencies)
+            if rejected > 0:
+                metrics.add_pruned(rejected)
+
+    if 'bounds' in stages:
+        start = time.perf_counter()
+        survivors = []
+        latencies = []
+        for candidate in candidates:
+            candidate_start = time.perf_counter()
+            local_data_set = local_records[candidate['local_id']]
+            external_data_set = external_records[candidate['external_id']]
+            candidate['date_score'], candidate['perfect_score_possible'] = get_date_bounds(local_data_set, external_data_set, date_table)
+            upper_bound = candidate['date_score'] + get_maximum_contribution(local_data_set, external_data_set, PIPELINE_NAME_FIELDS + PIPELINE_PLACE_FIELDS)
+            if could_reach_auto_matching(upper_bound, candidate['perfect_score_possible'], min_score):
+                survivors.append(candidate)
+            latencies.append(time.perf_counter() - candidate_start)
+        add_statistics('bounds', len(candidates), len(candidates) - len(survivors), time.perf_counter() - start, latencies)
+        candidates = survivors
+
+    if 'names' in stages:
+        start = time.perf_counter()
+        survivors = []
+        latencies = []
+        for candidate in candidates:
+            candidate_start = time.perf_counter()
+            local_data_set = local_records[candidate['local_id']]
+            external_data_set = external_records[candidate['external_id']]
+            if 'date_score' not in candidate:
+                candidate['date_score'], candidate['perfect_score_possible'] = get_date_bounds(local_data_set, external_data_set, date_table)
+            name_score, perfect_name_score = get_name_scores(local_data_set, external_data_set, disregard_names, shortform_index, name_graph)
+            upper_bound = candidate['date_score'] + name_score + get_maximum_contribution(local_data_set, external_data_set, PIPELINE_PLACE_FIELDS)
+            if could_reach_auto_matching(upper_bound, candidate['perfect_score_possible'] and perfect_name_score, min_score):
+                survivors.append(candidate)
+            latencies.append(time.perf_counter() - candidate_start)
+        add_statistics('names', len(candidates), len(candidates) - len(survivors), time.perf_counter() - start, latencies)
+        candidates = survivors
+
+    start = time.perf_counter()
+    results = []
+    latencies = []
+    for candidate in candidates:
+        candidate_start = time.perf_counter()
+        local_id = candidate['local_id']
+        external_id = candidate['external_id']
+        results.append((local_id, external_id, get_matching_score(local_records[local_id], external_records[external_id], values_to_be_disregarded, shortform_index, name_graph, date_table)))
+        latencies.append(time.perf_counter() - candidate_start)
+    add_statistics('full', len(candidates), 0, time.perf_counter() - start, latencies)
+    if metrics != None:
+        metrics.add_scored(len(results))
+
+    return {
+        'results': results,
+        'stages': statistics,
+    }
@@ -0,0 +1,200 @@
+'''
+    Canonical ids and containment relations for the small, repetitive vocabulary of birth and death places.
+
+    place_index = PlaceIndex.from_records({**local_records, **external_records}, hierarchy_path='places.json')
+    result = get_matching_score(local_data_set, external_data_set, place_index=place_index)
+
+    Place tokens (as split by split_string_values) are normalized once and mapped to integer ids. The optional
+    hierarchy is a JSON object of child -> parent places, e.g. {"Schwabing": "München", "München": "Bayern"}.
+    Places of the hierarchy are split and normalized like the places of records. A place of several tokens,
+    e.g. "Deutsches Reich", stands for all of its tokens whenever a record contains every one of them.
+
+    PlaceIndex.match computes the place score in three steps:
+      - exact: every original token of the smaller set also occurs in the larger set. get_matching_score
+        returns a score of exactly 1 in this case, so no comparison is needed.
+      - hierarchy: every place of the smaller set either occurs in the larger set or is an ancestor or a
+        descendant of one of its places, at least one of them being related by the hierarchy. A place at k levels
+        from its closest relative gets a distance of min(k * PLACE_HIERARCHY_LEVEL_DISTANCE, 1), equal places a
+        distance of 0. As for the fuzzy comparison, the score is cos(pi * (2 * mean + max) / 3) of these distances,
+        e.g. 0.95 for a city compared with its region.
+      - fuzzy: match_against_local_data as without an index.
+    Only the hierarchy step can change scores compared to get_matching_score without an index.
+'''
+import json
+
+import numpy as np
+
+from .automatic_matching_functions import match_against_local_data, get_names_as_dict
+
+PLACE_HIERARCHY_LEVEL_DISTANCE = 0.1
+PLACE_INDEX_FIELDS = ['birth_place', 'death_place']
+
+
+class PlaceIndex:
+
+    def __init__(self, hierarchy={}):
+        self.place_ids = {}
+        self.parents = []
+        self.ancestors = {}
+        self.multi_word_places = {} # first token -> list of (place, tokens), longest first
+        for child, parent in hierarchy.items():
+            self.add_relation(child, parent)
+
+    @classmethod
+    def from_records(cls, records, hierarchy_path=None, fields=PLACE_INDEX_FIELDS):
+        '''
+            Builds the index over the places of a dict of record_id -> record and an optional hierarchy file.
+        '''
+        hierarchy = {}
+        if hierarchy_path != None:
+            with open(hierarchy_path, encoding='utf-8') as f:
+                hierarchy = json.load(f)
+        place_index = cls(hierarchy)
+        for record in records.values():
+            for field in fields:
+                for place in get_names_as_dict(record.get(field, [])):
+                    place_index.get_place_id(place)
+        return place_index
+
+    def get_place_id(self, normalized_place):
+        place_id = self.place_ids.get(normalized_place, None)
+        if place_id == None:
+            place_id = len(self.parents)
+            self.place_ids[normalized_place] = place_id
+            self.parents.append(None)
+        return place_id
+
+    def add_multi_word_place(self, place):
+        '''
+            Returns the key of a place of the hierarchy: its normalized tokens joined by spaces.
+        '''
+        tokens = tuple(get_names_as_dict([place]))
+        if len(tokens) == 0:
+            raise ValueError(f'Place without any tokens in the hierarchy: {place!r}')
+        key = ' '.join(tokens)
+        if len(tokens) > 1:
+            places = self.multi_word_places.setdefault(tokens[0], [])
+            if (key, tokens) not in places:
+                places.append((key, tokens))
+                places.sort(key=lambda x: -len(x[1]))
+        return key
+
+    def add_relation(self, child, parent):
+        child_id = self.get_place_id(self.add_multi_word_place(child))
+        parent_id = self.get_place_id(self.add_multi_word_place(parent))
+        if child_id == parent_id or child_id in self.get_ancestors(parent_id):
+            raise ValueError(f'Cyclic place hierarchy: {child} -> {parent}')
+        self.parents[child_id] = parent_id
+        self.ancestors = {}
+
+    def get_ancestors(self, place_id):
+        '''
+            Returns a dict of ancestor id -> number of levels above place_id.
+        '''
+        ancestors = self.ancestors.get(place_id, None)
+        if ancestors == None:
+            ancestors = {}
+            parent_id = self.parents[place_id]
+            while parent_id != None:
+                ancestors[parent_id] = len(ancestors) + 1
+                parent_id = self.parents[parent_id]
+            self.ancestors[place_id] = ancestors
+        return ancestors
+
+    def get_places(self, data_set):
+        '''
+            Takes a dict of normalized place -> original places and returns a dict of place -> normalized tokens,
+            tokens forming a multi-word place of the hierarchy being replaced by that place.
+        '''
+        places = {}
+        covered_tokens = set()
+        for token in data_set:
+            for place, tokens in self.multi_word_places.get(token, []):
+                if all(x in data_set for x in tokens):
+                    places[place] = tokens
+                    covered_tokens.update(tokens)
+        for token in data_set:
+            if token not in covered_tokens:
+                places[token] = (token,)
+        return places
+
+    def get_hierarchy_distance(self, place_id, other_place_ids):
+        '''
+            Returns the number of levels between place_id and its closest ancestor or descendant in other_place_ids, None if there is none.
+        '''
+        levels = [self.get_ancestors(place_id).get(other_place_id, None) for other_place_id in other_place_ids]
+        levels += [self.get_ancestors(other_place_id).get(place_id, None) for other_place_id in other_place_ids]
+        levels = [x for x in levels if x != None]
+        return min(levels) if len(levels) > 0 else None
+
+    def get_blocking_keys(self, record, values_to_be_disregarded={}, include_ancestors=False, fields=PLACE_INDEX_FIELDS):
+        '''
+            Returns the sorted place ids of a record, optionally including the ids of all their ancestors.
+            Places in values_to_be_disregarded (e.g. 'Deutsches Reich') don't become keys.
+        '''
+        keys = set()
+        for field in fields:
+            disregard = get_names_as_dict(values_to_be_disregarded.get(field, []))
+            for place, tokens in self.get_places(get_names_as_dict(record.get(field, []))).items():
+                if all(token in disregard for token in tokens):
+                    continue
+                place_id = self.get_place_id(place)
+                keys.add(place_id)
+                if include_ancestors:
+                    keys.update(self.get_ancestors(place_id))
+        return sorted(keys)
+
+    def match(self, local_data, external_data, disregard_data_set={}):
+        '''
+            Takes two dicts of normalized place -> original places as returned by get_names_as_dict and
+            returns a result like the one get_matching_score stores for places, with 'score' being the
+            score of the smaller data set. 'place_match' tells which of the steps above was used.
+        '''
+        # same choice of the smaller data set as in match_against_local_data
+        if len(local_data) > len(external_data):
+            smaller_data_set, smaller_data_set_label, larger_data_set, larger_data_set_label = external_data, 'external', local_data, 'local'
+        else:
+            smaller_data_set, smaller_data_set_label, larger_data_set, larger_data_set_label = local_data, 'local', external_data, 'external'
+
+        larger_originals = {original for originals in larger_data_set.values() for original in originals}
+        if all(original in larger_originals for originals in smaller_data_set.values() for original in originals):
+            return self.get_result(np.float64(1), 'exact', local_data, external_data, smaller_data_set_label)
+
+        larger_ids = [self.place_ids[place] for place in self.get_places(larger_data_set) if place in self.place_ids]
+        distances = []
+        for place, tokens in self.get_places(smaller_data_set).items():
+            if all(token in larger_data_set for token in tokens):
+                distances.append(0)
+                continue
+            if all(token in disregard_data_set for token in tokens):
+                continue
+            levels = self.get_hierarchy_distance(self.place_ids[place], larger_ids) if place in self.place_ids else None
+            if levels == None:
+                distances = None
+                break
+            distances.append(min(levels * PLACE_HIERARCHY_LEVEL_DISTANCE, 1))
+        # without any containment relation the fuzzy comparison is used, which also scores differing originals
+        if distances != None and max(distances, default=0) > 0:
+            score = np.cos(np.pi * (2 * np.mean(distances) + max(distances)) / 3)
+            return self.get_result(score, 'hierarchy', local_data, external_data, smaller_data_set_label)
+
+        result = match_against_local_data(local_data, external_data, disregard_data_set, True)
+        result['score'] = result['smaller_data_set_score']
+        result['place_match'] = 'fuzzy'
+        return result
+
+    def get_result(self, score, place_match, local_data, external_data, smaller_data_set_label):
+        return {
+            'score': score,
+            'smaller_data_set_score': score,
+            f'{smaller_data_set_label}_score': score,
+            'local': local_data,
+            'external': external_data,
+            'place_match': place_match,
+        }
+
+    def get_statistics(self):
+        return {
+            'places': len(self.place_ids),
+            'places_with_parent': sum(1 for x in self.parents if x != None),
+        }
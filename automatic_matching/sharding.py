@@ -0,0 +1,218 @@
+'''
+    Splits a database to database linkage into independent shards, so that it can be run on several machines.
+
+    python -m automatic_matching.sharding shard local.jsonl external.jsonl shards/ --shards 16
+    python -m automatic_matching.sharding work shards/ --shard 3    (on any machine with access to shards/)
+    python -m automatic_matching.sharding merge shards/ matches.jsonl
+
+    Both databases are JSON lines files with one record per line, laid out as expected by
+    get_matching_score plus a unique 'id'. The records are partitioned by blocking key, a record
+    with several blocking keys is copied into the shard of each key. Pairs sharing keys of
+    different shards are therefore scored more than once and deduplicated by the merge step.
+    run_shards_locally runs all workers as separate processes on the local machine.
+'''
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+import zlib
+
+from .automatic_matching_functions import AUTOMATIC_MATCHING_ALGORITHM_VERSION_STRING
+from .blocking import RECORD_ID_FIELD, get_blocking_keys, get_blocks, get_candidate_pairs_from_blocks
+from .batch import score_candidate_pairs, get_result_summary
+from .metrics import LinkageMetrics
+from .pair_cache import PairResultCache
+
+SHARD_METADATA_FILE_NAME = 'shards.json'
+SHARD_WORKER_POLL_INTERVAL = 0.1 # seconds
+
+
+def read_jsonl_records(path):
+    '''
+        Reads a JSON lines file into a dict of record_id -> record.
+    '''
+    records = {}
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if len(line.strip()) == 0:
+                continue
+            record = json.loads(line)
+            records[record[RECORD_ID_FIELD]] = record
+    return records
+
+
+def write_jsonl_atomically(path, rows):
+    '''
+        Writes rows to a temporary file first and moves it into place afterwards,
+        so that readers either see a complete file or none at all.
+    '''
+    temporary_path = path + '.tmp'
+    with open(temporary_path, 'w', encoding='utf-8') as f:
+        for row in rows:
+            f.write(json.dumps(row, ensure_ascii=False) + '\n')
+    os.replace(temporary_path, path)
+
+
+def get_shard_for_blocking_key(key, number_of_shards):
+    # crc32 instead of hash() as the latter is randomized per process
+    return zlib.crc32(key.encode('utf-8')) % number_of_shards
+
+
+def get_shard_file_path(directory, shard, kind):
+    return os.path.join(directory, f'shard-{shard:05d}.{kind}.jsonl')
+
+
+def read_shard_metadata(directory):
+    with open(os.path.join(directory, SHARD_METADATA_FILE_NAME), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def shard_databases(local_path, external_path, directory, number_of_shards, values_to_be_disregarded={}):
+    '''
+        Partitions both databases by blocking key into number_of_shards pairs of shard files.
+    '''
+    os.makedirs(directory, exist_ok=True)
+    for kind, path in [('local', local_path), ('external', external_path)]:
+        shards = [[] for _ in range(number_of_shards)]
+        for record in read_jsonl_records(path).values():
+            for shard in sorted({get_shard_for_blocking_key(key, number_of_shards) for key in get_blocking_keys(record)}):
+                shards[shard].append(record)
+        for shard in range(number_of_shards):
+            write_jsonl_atomically(get_shard_file_path(directory, shard, kind), shards[shard])
+    # results of an earlier partitioning would otherwise be taken as finished shards
+    for shard in range(number_of_shards):
+        if os.path.exists(get_shard_file_path(directory, shard, 'results')):
+            os.remove(get_shard_file_path(directory, shard, 'results'))
+
+    with open(os.path.join(directory, SHARD_METADATA_FILE_NAME), 'w', encoding='utf-8') as f:
+        json.dump({
+            'number_of_shards': number_of_shards,
+            'values_to_be_disregarded': values_to_be_disregarded,
+            'matching_algorithm_version': AUTOMATIC_MATCHING_ALGORITHM_VERSION_STRING,
+        }, f, ensure_ascii=False)
+
+
+def process_shard(directory, shard, metrics=None, pair_cache=None):
+    '''
+        Scores all pairs of a single shard that share a blocking key belonging to this shard
+        and writes them to the shard's results file.
+    '''
+    metadata = read_shard_metadata(directory)
+    local_records = read_jsonl_records(get_shard_file_path(directory, shard, 'local'))
+    external_records = read_jsonl_records(get_shard_file_path(directory, shard, 'external'))
+    local_blocks = get_blocks(local_records)
+    external_blocks = get_blocks(external_records)
+    # records are copied into every shard of their keys, only the keys of this shard are compared here
+    keys = [key for key in local_blocks if get_shard_for_blocking_key(key, metadata['number_of_shards']) == shard]
+
+    candidate_pairs = get_candidate_pairs_from_blocks(local_blocks, external_blocks, keys)
+    scored_pairs = score_candidate_pairs(candidate_pairs, local_records, external_records, metadata['values_to_be_disregarded'], metrics, pair_cache)
+    write_jsonl_atomically(get_shard_file_path(directory, shard, 'results'), (get_result_summary(*x) for x in scored_pairs))
+
+
+def merge_shards(directory, output_path):
+    '''
+        Combines the results of all shards into a single JSON lines file.
+        Pairs that were scored in more than one shard are written only once.
+    '''
+    metadata = read_shard_metadata(directory)
+    missing_shards = [shard for shard in range(metadata['number_of_shards']) if not os.path.exists(get_shard_file_path(directory, shard, 'results'))]
+    if len(missing_shards) > 0:
+        raise FileNotFoundError(f'Missing results for shards: {", ".join(str(x) for x in missing_shards)}')
+
+    seen = set()
+    rows = []
+    for shard in range(metadata['number_of_shards']):
+        with open(get_shard_file_path(directory, shard, 'results'), encoding='utf-8') as f:
+            for line in f:
+                row = json.loads(line)
+                if (row['local_id'], row['external_id']) in seen:
+                    continue
+                seen.add((row['local_id'], row['external_id']))
+                rows.append(row)
+    write_jsonl_atomically(output_path, rows)
+    return len(rows)
+
+
+def run_shards_locally(directory, number_of_processes=None):
+    '''
+        Runs one worker process per shard on the local machine, at most number_of_processes at a time.
+        Shards that already have results are skipped, so an interrupted run can simply be started again.
+        The workers are polled every SHARD_WORKER_POLL_INTERVAL seconds, a finished worker is replaced right away.
+    '''
+    metadata = read_shard_metadata(directory)
+    number_of_processes = number_of_processes or os.cpu_count() or 1
+    pending = [shard for shard in range(metadata['number_of_shards']) if not os.path.exists(get_shard_file_path(directory, shard, 'results'))]
+    running = []
+    failed = []
+    while len(pending) > 0 or len(running) > 0:
+        while len(pending) > 0 and len(running) < number_of_processes:
+            shard = pending.pop(0)
+            running.append((shard, subprocess.Popen([sys.executable, '-m', 'automatic_matching.sharding', 'work', directory, '--shard', str(shard)])))
+        still_running = []
+        for shard, process in running:
+            return_code = process.poll()
+            if return_code == None:
+                still_running.append((shard, process))
+            elif return_code != 0:
+                failed.append(shard)
+        if len(still_running) == len(running):
+            time.sleep(SHARD_WORKER_POLL_INTERVAL)
+        running = still_running
+    if len(failed) > 0:
+        raise RuntimeError(f'Workers failed for shards: {", ".join(str(x) for x in failed)}')
+
+
+def run_sharding_command(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m automatic_matching.sharding', description='Sharded database to database linkage')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    shard_parser = subparsers.add_parser('shard', help='Partition both databases into shard files')
+    shard_parser.add_argument('local')
+    shard_parser.add_argument('external')
+    shard_parser.add_argument('directory')
+    shard_parser.add_argument('--shards', type=int, required=True)
+    shard_parser.add_argument('--disregard', help='JSON file with values to be disregarded')
+
+    work_parser = subparsers.add_parser('work', help='Score a single shard')
+    work_parser.add_argument('directory')
+    work_parser.add_argument('--shard', type=int, required=True)
+    work_parser.add_argument('--metrics', help='Write a JSON snapshot of the run metrics to this file')
+    work_parser.add_argument('--report-interval', type=float, help='Log the run metrics every n seconds')
+    work_parser.add_argument('--pair-cache-size', type=int, help='Score pairs of duplicate records only once, keeping up to n results')
+
+    merge_parser = subparsers.add_parser('merge', help='Merge the results of all shards')
+    merge_parser.add_argument('directory')
+    merge_parser.add_argument('output')
+
+    run_parser = subparsers.add_parser('run', help='Score all shards in local worker processes')
+    run_parser.add_argument('directory')
+    run_parser.add_argument('--processes', type=int)
+
+    args = parser.parse_args(argv)
+    if args.command == 'shard':
+        values_to_be_disregarded = {}
+        if args.disregard:
+            with open(args.disregard, encoding='utf-8') as f:
+                values_to_be_disregarded = json.load(f)
+        shard_databases(args.local, args.external, args.directory, args.shards, values_to_be_disregarded)
+    elif args.command == 'work':
+        metrics = None
+        if args.metrics or args.report_interval:
+            logging.basicConfig(level=logging.INFO)
+            metrics = LinkageMetrics(report_interval=args.report_interval)
+        pair_cache = PairResultCache(args.pair_cache_size) if args.pair_cache_size else None
+        process_shard(args.directory, args.shard, metrics, pair_cache)
+        if args.metrics:
+            metrics.save(args.metrics)
+    elif args.command == 'merge':
+        print(f'Merged {merge_shards(args.directory, args.output)} pairs')
+    elif args.command == 'run':
+        run_shards_locally(args.directory, args.processes)
+
+
+if __name__ == '__main__':
+    run_sharding_command()
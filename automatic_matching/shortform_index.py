@@ -0,0 +1,91 @@
+from doublemetaphone import doublemetaphone
+
+from .automatic_matching_functions import get_names_as_dict
+
+SHORTFORM_INDEX_CODE_IDS = None # key of the set of code ids stored in every trie node
+
+
+class ShortformIndex:
+    '''
+        Precomputed index over the Double Metaphone codes of a forename vocabulary.
+
+        The codes are computed once per name, get_doublemetaphone_matching_score uses them through get_codes.
+        All suffixes of all codes are also stored in a trie, every node holds the ids of the codes that contain
+        the path leading to it, so that get_names_containing_code finds all potential long forms of a code
+        (e.g. ALKSNTR for Alexander containing ALK for Alex) with a single walk, e.g. to generate candidates.
+        Whether two given codes are shortforms of each other is cheaper to answer with is_potential_shortform_code.
+    '''
+
+    def __init__(self, names=[]):
+        self.codes = {}
+        self.names = set()
+        self.code_ids = {}
+        self.names_by_code_id = []
+        self.root = {SHORTFORM_INDEX_CODE_IDS: set()}
+        for name in names:
+            self.add(name)
+
+    @classmethod
+    def from_records(cls, records, field='forenames'):
+        '''
+            Builds the index from the original and normalized forenames of a dict of record_id -> record.
+        '''
+        index = cls()
+        for record in records.values():
+            names = get_names_as_dict(record.get(field, []), False)
+            for normalized in names:
+                index.add(normalized)
+                for original in names[normalized]:
+                    index.add(original)
+        return index
+
+    def get_codes(self, name):
+        '''
+            Returns the cached Double Metaphone codes of a name.
+        '''
+        if name not in self.codes:
+            self.codes[name] = doublemetaphone(name)
+        return self.codes[name]
+
+    def add_code(self, code):
+        if code in self.code_ids:
+            return self.code_ids[code]
+        code_id = len(self.code_ids)
+        self.code_ids[code] = code_id
+        self.names_by_code_id.append([])
+        for start in range(len(code)):
+            node = self.root
+            for character in code[start:]:
+                if character not in node:
+                    node[character] = {SHORTFORM_INDEX_CODE_IDS: set()}
+                node = node[character]
+                node[SHORTFORM_INDEX_CODE_IDS].add(code_id)
+        return code_id
+
+    def add(self, name):
+        if name in self.names:
+            return
+        self.names.add(name)
+        for code in set(self.get_codes(name)):
+            if len(code) > 0:
+                self.names_by_code_id[self.add_code(code)].append(name)
+
+    def get_node(self, code):
+        node = self.root
+        for character in code:
+            if character not in node:
+                return None
+            node = node[character]
+        return node
+
+    def get_names_containing_code(self, code):
+        '''
+            Returns all names of the vocabulary with a metaphone code containing the given code, i.e. all potential long forms.
+        '''
+        node = self.get_node(code) if len(code) > 0 else None
+        if node == None:
+            return []
+        names = []
+        for code_id in node[SHORTFORM_INDEX_CODE_IDS]:
+            names += self.names_by_code_id[code_id]
+        return names
@@ -0,0 +1,128 @@
+'''
+    Column oriented scoring of two tables, e.g. SQL exports, without building a record dict per row.
+
+    A table is a dict of column name -> sequence of values, a pandas DataFrame or a pyarrow Table, using the
+    field names of get_matching_score as column names. Multi-valued cells are delimiter separated strings
+    (split like split_string_values for names and places, at ';' and ',' for dates) or lists.
+
+    scores = score_column_pairs(local_table, external_table, local_indices, external_indices)
+    matched = scores['automatically_matched']
+'''
+import math
+import re
+
+import numpy as np
+
+from .automatic_matching_functions import (
+    NAME_FIELDS, DATE_FIELDS, get_names_as_dict, prepare_data_set, get_matching_score_for_prepared_data_sets,
+)
+from .columnar_output import COLUMNAR_OUTPUT_FIELDS
+
+
+def split_date_values(value):
+    return list(filter(None, [x.strip() for x in re.split(r'[;,]', value)]))
+
+
+def is_missing_value(value):
+    if value is None:
+        return True
+    if isinstance(value, float) and math.isnan(value):
+        return True
+    return isinstance(value, str) and len(value.strip()) == 0
+
+
+def get_column_values(table, column):
+    '''
+        Returns the values of a column as a list, or None if the table doesn't have it.
+        pandas and pyarrow tables are recognised by their interface, neither of them has to be installed.
+    '''
+    if hasattr(table, 'column_names'): # pyarrow.Table
+        return table.column(column).to_pylist() if column in table.column_names else None
+    if hasattr(table, 'iloc'): # pandas.DataFrame
+        return table[column].tolist() if column in table.columns else None
+    return list(table[column]) if column in table else None
+
+
+def prepare_column(values, field, normalizer=None):
+    '''
+        Normalizes a column once: every distinct cell is parsed and normalized a single time.
+        An optional NameNormalizer also memoizes the names repeating across cells and columns.
+        Returns one prepared value per row, None for empty cells.
+    '''
+    prepared_values = {}
+    result = []
+    for value in values:
+        if is_missing_value(value):
+            result.append(None)
+            continue
+        key = tuple(value) if isinstance(value, (list, tuple)) else value
+        if key not in prepared_values:
+            cell_values = list(value) if isinstance(value, (list, tuple)) else None
+            if field in NAME_FIELDS:
+                prepared_values[key] = get_names_as_dict(cell_values if cell_values != None else [value], NAME_FIELDS[field], normalizer=normalizer)
+            else:
+                prepared_values[key] = cell_values if cell_values != None else split_date_values(value)
+        result.append(prepared_values[key])
+    return result
+
+
+def prepare_table(table, normalizer=None):
+    '''
+        Returns a dict of field -> list of prepared values for all fields known to get_matching_score.
+    '''
+    prepared_columns = {}
+    for field in list(NAME_FIELDS) + DATE_FIELDS:
+        values = get_column_values(table, field)
+        if values != None:
+            prepared_columns[field] = prepare_column(values, field, normalizer)
+    return prepared_columns
+
+
+def get_prepared_row(prepared_columns, index):
+    return {field: values[index] for field, values in prepared_columns.items() if values[index] is not None}
+
+
+def score_column_pairs(local_table, external_table, local_indices, external_indices, values_to_be_disregarded={}, shortform_index=None, name_graph=None, date_table=None, normalizer=None):
+    '''
+        Scores the row pairs (local_indices[i], external_indices[i]) of two tables.
+        Returns a dict of numpy arrays aligned to the input pairs: absolute_score, relative_score,
+        total_relative_score, automatically_matched and one <field>_score per field (NaN if not compared).
+        The tables are normalized with normalize_string, or with the NameNormalizer if provided.
+    '''
+    local_indices = np.asarray(local_indices)
+    external_indices = np.asarray(external_indices)
+    if len(local_indices) != len(external_indices):
+        raise ValueError('local_indices and external_indices must have the same length')
+
+    local_columns = prepare_table(local_table, normalizer)
+    external_columns = prepare_table(external_table, normalizer)
+    disregard = prepare_data_set(values_to_be_disregarded, normalizer)
+
+    number_of_pairs = len(local_indices)
+    scores = {
+        'absolute_score': np.zeros(number_of_pairs),
+        'relative_score': np.zeros(number_of_pairs),
+        'total_relative_score': np.zeros(number_of_pairs),
+        'automatically_matched': np.zeros(number_of_pairs, dtype=bool),
+        **{f'{field}_score': np.full(number_of_pairs, np.nan) for field in COLUMNAR_OUTPUT_FIELDS},
+    }
+
+    local_rows = {}
+    external_rows = {}
+    for i in range(number_of_pairs):
+        local_index = int(local_indices[i])
+        external_index = int(external_indices[i])
+        if local_index not in local_rows:
+            local_rows[local_index] = get_prepared_row(local_columns, local_index)
+        if external_index not in external_rows:
+            external_rows[external_index] = get_prepared_row(external_columns, external_index)
+
+        result = get_matching_score_for_prepared_data_sets(local_rows[local_index], external_rows[external_index], disregard, shortform_index, name_graph, date_table)
+        scores['absolute_score'][i] = result['absolute_score']
+        scores['relative_score'][i] = result['relative_score']
+        scores['total_relative_score'][i] = result['total_relative_score']
+        scores['automatically_matched'][i] = result['automatically_matched']
+        for field in COLUMNAR_OUTPUT_FIELDS:
+            if 'score' in result[field]:
+                scores[f'{field}_score'][i] = result[field]['score']
+    return scores
@@ -0,0 +1,38 @@
+import random
+
+from automatic_matching import assign_one_to_one, ASSIGNMENT_METHOD_OPTIMAL
+
+
+def get_best_total_score(scored_pairs):
+    '''
+        Tries every one-to-one assignment.
+    '''
+    local_ids = sorted({pair[0] for pair in scored_pairs})
+    scores = {}
+    for local_id, external_id, score in scored_pairs:
+        scores[(local_id, external_id)] = max(score, scores.get((local_id, external_id), 0))
+
+    def get_best(i, assigned_external):
+        if i == len(local_ids):
+            return 0
+        best = get_best(i + 1, assigned_external)
+        for (local_id, external_id), score in scores.items():
+            if local_id == local_ids[i] and external_id not in assigned_external:
+                best = max(best, score + get_best(i + 1, assigned_external | {external_id}))
+        return best
+
+    return get_best(0, frozenset())
+
+
+def test_optimal_assignment_against_brute_force():
+    generator = random.Random(0)
+    for _ in range(300):
+        number_of_local, number_of_external = generator.randint(1, 6), generator.randint(1, 6)
+        scored_pairs = [
+            (local_id, external_id, generator.choice([generator.randint(1, 10), generator.random() * 100]))
+            for local_id in range(number_of_local) for external_id in range(number_of_external) if generator.random() < 0.5
+        ]
+        assignment = assign_one_to_one(scored_pairs, ASSIGNMENT_METHOD_OPTIMAL)
+        assert len({x[0] for x in assignment}) == len({x[1] for x in assignment}) == len(assignment)
+        assert all(pair in scored_pairs for pair in assignment)
+        assert abs(sum(x[2] for x in assignment) - get_best_total_score(scored_pairs)) < 1e-9
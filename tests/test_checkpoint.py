@@ -0,0 +1,39 @@
+import os
+
+import pytest
+
+from automatic_matching import get_candidate_pairs, TTP_MATCHING_DEFAULT_DISREGARD_VALUES
+from automatic_matching.checkpoint import run_linkage_with_checkpoints, read_checkpoint_results, get_chunk_file_path
+from automatic_matching.equivalence import get_random_pairs
+
+
+@pytest.fixture(scope='module')
+def databases():
+    pairs = get_random_pairs(60, seed=2)
+    return {f'l{i}': pair['local'] for i, pair in enumerate(pairs)}, {f'e{i}': pair['external'] for i, pair in enumerate(pairs)}
+
+
+def test_resumed_run_returns_the_same_rows(tmp_path, databases):
+    local_records, external_records = databases
+    directory = str(tmp_path / 'run')
+    number_of_pairs = run_linkage_with_checkpoints(local_records, external_records, directory, TTP_MATCHING_DEFAULT_DISREGARD_VALUES, chunk_size=100)
+    rows = list(read_checkpoint_results(directory))
+    assert number_of_pairs == len(rows) > 300
+    assert [(row['local_id'], row['external_id']) for row in rows] == list(get_candidate_pairs(local_records, external_records))
+
+    os.remove(get_chunk_file_path(directory, 2))
+    with pytest.raises(FileNotFoundError):
+        read_checkpoint_results(directory)
+    run_linkage_with_checkpoints(local_records, external_records, directory, TTP_MATCHING_DEFAULT_DISREGARD_VALUES, chunk_size=100)
+    assert list(read_checkpoint_results(directory)) == rows
+
+
+def test_changed_input_is_refused(tmp_path, databases):
+    local_records, external_records = databases
+    directory = str(tmp_path / 'run')
+    run_linkage_with_checkpoints(local_records, external_records, directory, chunk_size=100)
+    changed_records = {**local_records, 'l0': {**local_records['l0'], 'birth_date': ['1900-01-01']}}
+    with pytest.raises(ValueError):
+        run_linkage_with_checkpoints(changed_records, external_records, directory, chunk_size=100)
+    with pytest.raises(ValueError):
+        run_linkage_with_checkpoints(local_records, external_records, directory, TTP_MATCHING_DEFAULT_DISREGARD_VALUES, chunk_size=100)
@@ -0,0 +1,93 @@
+import pytest
+
+from automatic_matching import (
+    get_matching_score, ShortformIndex, DateScoreTable, PlaceIndex, PairResultCache, NameNormalizer, score_column_pairs,
+    COLUMNAR_OUTPUT_FIELDS, match_against_local_data,
+)
+from automatic_matching.equivalence import (
+    get_golden_corpus, get_matching_score_cases, get_name_cases, get_date_cases, run_differential_test,
+    run_name_differential_test, run_date_differential_test,
+)
+
+TABULAR_KEYS = ['absolute_score', 'relative_score', 'total_relative_score', 'automatically_matched']
+
+
+@pytest.fixture(scope='module')
+def corpus():
+    return get_golden_corpus()
+
+
+@pytest.fixture(scope='module')
+def cases(corpus):
+    return get_matching_score_cases(corpus)
+
+
+def get_records(corpus):
+    return {f'{pair["name"]} {side}': pair[side] for pair in corpus for side in ['local', 'external']}
+
+
+def get_scores(result):
+    '''
+        The scores of a result without the details of the comparisons, which the place index skips for exact matches.
+    '''
+    return {**{key: result[key] for key in TABULAR_KEYS}, **{field: result[field].get('score') for field in COLUMNAR_OUTPUT_FIELDS}}
+
+
+def assert_equivalent(engine, cases, keys=None, reference=get_matching_score):
+    report = run_differential_test(engine, cases, reference, keys=keys, verbose=False)
+    assert report['cases'] == len(cases)
+    assert report['divergences'] == []
+
+
+def test_shortform_index(corpus, cases):
+    shortform_index = ShortformIndex.from_records(get_records(corpus))
+    assert_equivalent(lambda local, external, disregard: get_matching_score(local, external, disregard, shortform_index=shortform_index), cases)
+
+
+def test_date_table(cases):
+    date_table = DateScoreTable()
+    # the second pass is answered from the table
+    assert_equivalent(lambda local, external, disregard: get_matching_score(local, external, disregard, date_table=date_table), cases + cases)
+    assert date_table.get_statistics()['hits'] > 0
+
+
+def test_place_index_without_hierarchy(corpus, cases):
+    place_index = PlaceIndex.from_records(get_records(corpus))
+    engine = lambda local, external, disregard: get_scores(get_matching_score(local, external, disregard, place_index=place_index))
+    assert_equivalent(engine, cases, reference=lambda local, external, disregard: get_scores(get_matching_score(local, external, disregard)))
+
+
+def test_name_normalizer(cases):
+    normalizer = NameNormalizer()
+    assert_equivalent(lambda local, external, disregard: get_matching_score(local, external, disregard, normalizer=normalizer), cases)
+
+
+def test_tabular(cases):
+
+    def engine(local, external, disregard):
+        local_table = {field: [values] for field, values in local.items()}
+        external_table = {field: [values] for field, values in external.items()}
+        scores = score_column_pairs(local_table, external_table, [0], [0], disregard)
+        return {key: scores[key][0].item() for key in TABULAR_KEYS}
+
+    assert_equivalent(engine, cases, TABULAR_KEYS)
+
+
+def test_pair_cache(cases):
+    pair_cache = PairResultCache()
+    assert_equivalent(pair_cache.get_matching_score, cases + cases)
+    assert pair_cache.get_statistics()['hits'] >= len(cases)
+
+
+def test_name_comparisons_with_shortform_index(corpus):
+    shortform_index = ShortformIndex.from_records(get_records(corpus))
+    engine = lambda local, external, disregard, potential_shortform: match_against_local_data(local, external, disregard, potential_shortform, shortform_index if potential_shortform else None)
+    report = run_name_differential_test(engine, get_name_cases(corpus), verbose=False)
+    assert report['divergences'] == []
+
+
+def test_date_comparisons_with_date_table(corpus):
+    date_table = DateScoreTable()
+    cases = get_date_cases(corpus)
+    report = run_date_differential_test(date_table.match, cases + cases, verbose=False)
+    assert report['divergences'] == []
@@ -0,0 +1,38 @@
+from automatic_matching import (
+    get_matching_score, NameSimilarityGraph, get_doublemetaphone_matching_score, get_name_graph_vocabulary, NAME_GRAPH_DEFAULT_THRESHOLD,
+)
+from automatic_matching.equivalence import get_golden_corpus, get_matching_score_cases, run_differential_test
+
+
+def get_graph_databases(corpus):
+    return [{pair['name']: pair[side] for pair in corpus} for side in ['local', 'external', 'values_to_be_disregarded']]
+
+
+def test_graph_keeps_pairs_of_original_and_normalized_names():
+    graph = NameSimilarityGraph.build([{1: {'surnames': ['Glässner']}}, {1: {'surnames': ['Glesner']}}], threshold=1.01)
+    # match_against_local_data compares the original 'Glässner' with the normalized 'glesner'
+    assert graph.get_score('Glässner', 'glesner') == get_doublemetaphone_matching_score('Glässner', 'glesner')
+
+
+def test_complete_graph_reproduces_get_matching_score():
+    corpus = get_golden_corpus(random_pairs=300)
+    # above the maximal score of 1 every pair of tokens is stored
+    graph = NameSimilarityGraph.build(get_graph_databases(corpus), threshold=1.01)
+    engine = lambda local, external, disregard: get_matching_score(local, external, disregard, name_graph=graph)
+    report = run_differential_test(engine, get_matching_score_cases(corpus), tolerance=0, verbose=False)
+    assert report['divergences'] == []
+
+
+def test_default_threshold_keeps_every_pair_below_it():
+    corpus = get_golden_corpus(random_pairs=300)
+    graph = NameSimilarityGraph.build(get_graph_databases(corpus))
+    pairs_below_threshold = 0
+    for group in get_name_graph_vocabulary(get_graph_databases(corpus)):
+        for i, token_1 in enumerate(group):
+            for token_2 in group[i + 1:]:
+                for potential_shortform in [False, True]:
+                    score = get_doublemetaphone_matching_score(token_1, token_2, potential_shortform)
+                    if score < NAME_GRAPH_DEFAULT_THRESHOLD:
+                        pairs_below_threshold += 1
+                        assert graph.get_score(token_1, token_2, potential_shortform) == score, (token_1, token_2, potential_shortform)
+    assert pairs_below_threshold > 0
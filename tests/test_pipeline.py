@@ -0,0 +1,49 @@
+import random
+
+import pytest
+
+from automatic_matching import (
+    get_matching_score, get_candidate_pairs, run_scoring_pipeline, DateScoreTable, TTP_MATCHING_DEFAULT_DISREGARD_VALUES,
+)
+from automatic_matching.equivalence import get_golden_corpus
+
+DISREGARD_VALUES = {'none': {}, 'default': TTP_MATCHING_DEFAULT_DISREGARD_VALUES}
+
+
+@pytest.fixture(scope='module')
+def databases():
+    corpus = get_golden_corpus()
+    local_records = {pair['name']: pair['local'] for pair in corpus}
+    external_records = {pair['name']: pair['external'] for pair in corpus}
+    # a sample of the blocked pairs, mostly different persons, and all pairs of the corpus
+    blocked_pairs = random.Random(0).sample(sorted(set(get_candidate_pairs(local_records, external_records))), 3000)
+    candidate_pairs = sorted(set(blocked_pairs) | {(name, name) for name in local_records})
+    return local_records, external_records, candidate_pairs
+
+
+@pytest.fixture(scope='module')
+def reference_results(databases):
+    local_records, external_records, candidate_pairs = databases
+    return {
+        disregard_label: {(local_id, external_id): get_matching_score(local_records[local_id], external_records[external_id], values_to_be_disregarded) for local_id, external_id in candidate_pairs}
+        for disregard_label, values_to_be_disregarded in DISREGARD_VALUES.items()
+    }
+
+
+@pytest.mark.parametrize('disregard_label', list(DISREGARD_VALUES))
+@pytest.mark.parametrize('min_score', [None, 40])
+def test_pipeline_keeps_every_pair_that_can_be_matched(databases, reference_results, disregard_label, min_score):
+    local_records, external_records, candidate_pairs = databases
+    pipeline = run_scoring_pipeline(candidate_pairs, local_records, external_records, DISREGARD_VALUES[disregard_label], min_score=min_score, date_table=DateScoreTable())
+    results = {(local_id, external_id): result for local_id, external_id, result in pipeline['results']}
+    # the pruning stages have to reject something, otherwise this proves nothing
+    assert len(results) < len(candidate_pairs)
+
+    expected = 0
+    for local_id, external_id in candidate_pairs:
+        result = reference_results[disregard_label][(local_id, external_id)]
+        if result['automatically_matched'] or (min_score != None and result['absolute_score'] >= min_score):
+            expected += 1
+            assert (local_id, external_id) in results
+            assert results[(local_id, external_id)]['absolute_score'] == result['absolute_score']
+    assert expected > 0
@@ -0,0 +1,13 @@
+from automatic_matching import PlaceIndex, get_matching_score
+
+
+def test_multi_word_places_of_the_hierarchy():
+    place_index = PlaceIndex({'München': 'Bayern', 'Bayern': 'Deutsches Reich'})
+    result = get_matching_score({'surnames': ['Cohn'], 'birth_place': ['München']}, {'surnames': ['Cohn'], 'birth_place': ['Deutsches Reich']}, place_index=place_index)
+    assert result['birth_place']['place_match'] == 'hierarchy'
+    assert place_index.get_blocking_keys({'birth_place': ['Deutsches Reich']}) == [place_index.place_ids['deutsches reich']]
+
+
+def test_from_records_takes_a_dict_of_records():
+    place_index = PlaceIndex.from_records({'a': {'birth_place': ['Berlin']}, 'b': {'death_place': ['Wien']}})
+    assert sorted(place_index.place_ids) == ['berlin', 'vien']
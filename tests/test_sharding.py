@@ -0,0 +1,38 @@
+import json
+import os
+
+import automatic_matching
+from automatic_matching import get_matching_score, get_candidate_pairs, TTP_MATCHING_DEFAULT_DISREGARD_VALUES
+from automatic_matching.equivalence import get_random_pairs
+from automatic_matching.sharding import shard_databases, run_shards_locally, merge_shards
+
+
+def write_database(path, records):
+    with open(path, 'w', encoding='utf-8') as f:
+        for record_id, record in records.items():
+            f.write(json.dumps({'id': record_id, **record}, ensure_ascii=False) + '\n')
+
+
+def test_sharded_linkage_scores_every_candidate_pair_once(tmp_path, monkeypatch):
+    # the workers are separate processes, which have to find the package as well
+    monkeypatch.setenv('PYTHONPATH', os.path.dirname(os.path.dirname(os.path.abspath(automatic_matching.__file__))))
+    pairs = get_random_pairs(150, seed=1)
+    local_records = {f'l{i}': pair['local'] for i, pair in enumerate(pairs)}
+    external_records = {f'e{i}': pair['external'] for i, pair in enumerate(pairs)}
+    write_database(tmp_path / 'local.jsonl', local_records)
+    write_database(tmp_path / 'external.jsonl', external_records)
+
+    directory = str(tmp_path / 'shards')
+    shard_databases(str(tmp_path / 'local.jsonl'), str(tmp_path / 'external.jsonl'), directory, 4, TTP_MATCHING_DEFAULT_DISREGARD_VALUES)
+    run_shards_locally(directory, 2)
+    number_of_rows = merge_shards(directory, str(tmp_path / 'matches.jsonl'))
+
+    with open(tmp_path / 'matches.jsonl', encoding='utf-8') as f:
+        rows = [json.loads(line) for line in f]
+    merged_pairs = [(row['local_id'], row['external_id']) for row in rows]
+    assert number_of_rows == len(rows) == len(set(merged_pairs))
+    assert set(merged_pairs) == set(get_candidate_pairs(local_records, external_records))
+    for row in rows:
+        result = get_matching_score(local_records[row['local_id']], external_records[row['external_id']], TTP_MATCHING_DEFAULT_DISREGARD_VALUES)
+        assert row['absolute_score'] == float(result['absolute_score'])
+        assert row['automatically_matched'] == result['automatically_matched']